@@ -0,0 +1,167 @@
+import os
+import json
+from contextlib import contextmanager
+from urllib.parse import urljoin
+
+import metrics
+import netlog
+
+# API_CAPTURE=1 reads products from the JSON that a retailer's own page fetches to fill its
+# product grid (Sainsbury's gol-ui product API, Ocado's product lookups) instead of reading
+# the rendered tiles back out of the DOM. The API objects also carry fields the tiles don't
+# show, such as promotions and loyalty prices. Responses come from Chrome's performance log
+# (netlog.py). A page whose products arrive some other way, e.g. rendered on the server, is
+# read from the DOM as before.
+API_CAPTURE = os.environ.get("API_CAPTURE", "0") == "1"
+
+_watching = {}  # id(driver) -> (ApiSource, rows parsed since the last take)
+
+
+def json_field(paths, format=None, default=None):
+    """
+    A column read from one product object: the first dotted path with a value ("price.current",
+    "promotions.0.description"), passed through format(value) if given.
+    """
+    return {"paths": [paths] if isinstance(paths, str) else list(paths), "format": format, "default": default}
+
+
+def lookup(data, path):
+    for key in path.split("."):
+        if isinstance(data, list):
+            try:
+                data = data[int(key)]
+            except (ValueError, IndexError):
+                return None
+        elif isinstance(data, dict):
+            data = data.get(key)
+        else:
+            return None
+        if data is None:
+            return None
+    return data
+
+
+def money(value):
+    """1.5 -> "£1.50", the way prices read on the tiles. Strings are kept as they are."""
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return f"£{value:.2f}"
+    return str(value)
+
+
+class ApiSource:
+    """
+    A retailer's product-list API: the requests to pick out (URL substrings) and the columns
+    to read from each product object (json_field specs, or functions of the object). `items`
+    is the path to the product list in the JSON; without it the first lists of objects that
+    have a Name are used, wherever they are.
+    """
+
+    def __init__(self, url_patterns, fields, items=None, required=("Name", "URL")):
+        self.url_patterns = tuple(url_patterns)
+        self.fields = fields
+        self.items = items
+        self.required = required
+
+    def matches(self, url):
+        return any(pattern in url for pattern in self.url_patterns)
+
+    def _is_product(self, obj):
+        return isinstance(obj, dict) and self._read(obj, self.fields["Name"]) not in (None, "")
+
+    def _product_lists(self, data):
+        if isinstance(data, list):
+            if data and self._is_product(data[0]):
+                yield data
+                return
+            for value in data:
+                yield from self._product_lists(value)
+        elif isinstance(data, dict):
+            for value in data.values():
+                yield from self._product_lists(value)
+
+    def _read(self, product, spec):
+        if callable(spec):
+            return spec(product)
+        for path in spec["paths"]:
+            value = lookup(product, path)
+            if value not in (None, ""):
+                return spec["format"](value) if spec["format"] else value
+        return spec["default"]
+
+    def parse(self, data, response_url):
+        """Rows from one API response, with the same column names as the scraper's tile fields."""
+        products = lookup(data, self.items) if self.items else None
+        lists = [products] if isinstance(products, list) else self._product_lists(data)
+        rows = []
+        for products in lists:
+            for product in products:
+                if not isinstance(product, dict):
+                    continue
+                row = {name: self._read(product, spec) for name, spec in self.fields.items()}
+                if any(not row.get(name) for name in self.required):
+                    continue
+                if row.get("URL"):
+                    row["URL"] = urljoin(response_url, str(row["URL"]))
+                rows.append(row)
+        return rows
+
+
+def configure(options):
+    """Turn on the performance log in a scraper's ChromeOptions when API capture is on."""
+    if API_CAPTURE:
+        netlog.enable(options)
+    return options
+
+
+def _on_response(driver, response):
+    watched = _watching.get(id(driver))
+    if watched is None or response.status != 200 or "json" not in response.mime.lower():
+        return
+    source, rows = watched
+    if not source.matches(response.url):
+        return
+    body = response.body()
+    if not body:
+        return
+    try:
+        data = json.loads(body)
+    except ValueError:
+        return
+    rows.extend(source.parse(data, response.url))
+
+
+def watch(driver, source):
+    """Start collecting `source` products from the driver's traffic. Earlier responses are ignored."""
+    if not API_CAPTURE:
+        return
+    netlog.poll(driver)
+    _watching[id(driver)] = (source, [])
+
+
+def unwatch(driver):
+    _watching.pop(id(driver), None)
+
+
+@contextmanager
+def watching(driver, source):
+    watch(driver, source)
+    try:
+        yield driver
+    finally:
+        unwatch(driver)
+
+
+def take(driver):
+    """The products captured from the driver's API responses since the last call ([] if none or not watching)."""
+    watched = _watching.get(id(driver))
+    if watched is None:
+        return []
+    with metrics.phase("extract"):
+        netlog.poll(driver)
+        rows = watched[1][:]
+        del watched[1][:]
+    return rows
+
+
+if API_CAPTURE:
+    netlog.add_listener(_on_response)
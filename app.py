@@ -1,15 +1,45 @@
-from flask import Flask, request, render_template_string, Response
-import subprocess
+from flask import Flask, request, render_template_string, Response, jsonify, abort, redirect, url_for
+import importlib
+import threading
+import json
+import queue
+import os
+import time
+from result_cache import ResultCache, STALE
+import jobs
+import metrics
+import driver_pool
 
 app = Flask(__name__)
-#"Tesco": "tesco_scraper.py",
+# Scraper modules, imported on first use. Each exposes scrape(query, options) for in-process runs.
+#"Tesco": "tesco_scraper",
 scrapers = {
-    "Asda": "asda_scraper.py",
-    "Co-op": "coop_scraper_v2.py",
-    "Ocado": "ocado_scraper.py",
-    "Morrisons": "morrisons_scraper.py",
-    "Sainsburys": "sainsburys_scraper.py",
+    "Asda": "asda_scraper",
+    "Co-op": "coop_scraper_v2",
+    "Ocado": "ocado_scraper",
+    "Morrisons": "morrisons_scraper",
+    "Sainsburys": "sainsburys_scraper",
 }
+scraper_modules = {}
+scraper_modules_lock = threading.Lock()
+
+# How many scrapers may run at once across every search. 1 restores the old one-at-a-time
+# behaviour. The browsers they use are capped separately by MAX_BROWSERS (driver_pool.py).
+MAX_PARALLEL_SCRAPERS = int(os.environ.get("MAX_PARALLEL_SCRAPERS", len(scrapers)))
+# How many scrapers may hit the same retailer at once, across all searches
+MAX_PER_RETAILER = int(os.environ.get("MAX_PER_RETAILER", 1))
+# Quiet streams get a heartbeat this often so proxies keep them open; it is also how a closed tab is noticed
+SSE_HEARTBEAT = float(os.environ.get("SSE_HEARTBEAT", 15))
+
+# Finished runs are replayed from here; see result_cache.py for the TTL settings
+results = ResultCache()
+refreshing = set()
+refreshing_lock = threading.Lock()
+
+# Searches queue here and are worked off fairly across users by a fixed pool of workers
+scheduler = jobs.TaskScheduler(MAX_PARALLEL_SCRAPERS, MAX_PER_RETAILER)
+# The server keeps its browser pools topped up; command-line runs launch only what they use
+driver_pool.enable_prewarm()
 
 HTML = """
 <!DOCTYPE html>
@@ -62,6 +92,36 @@ HTML = """
             max-height: 500px;
             overflow-y: auto;
         }
+        .retailer {
+            display: flex;
+            align-items: center;
+            gap: 12px;
+            margin-top: 10px;
+            font-size: 0.9rem;
+        }
+        .retailer .name {
+            width: 100px;
+            font-weight: bold;
+        }
+        .retailer .bar {
+            flex: 0 0 200px;
+            height: 10px;
+            background: #ecf0f1;
+            border-radius: 5px;
+            overflow: hidden;
+        }
+        .retailer .fill {
+            width: 0;
+            height: 100%;
+            background: #1abc9c;
+            transition: width 0.3s;
+        }
+        .retailer .fill.stopped {
+            background: #e67e22;
+        }
+        .retailer .stats {
+            color: #7f8c8d;
+        }
     </style>
 </head>
 <body>
@@ -72,22 +132,89 @@ HTML = """
             <button type="submit">Run Scrapers</button>
         </form>
         {% if stream %}
+        <button type="button" id="cancel" onclick="fetch('/jobs/{{ job_id }}/cancel', {method: 'POST'})">Cancel</button>
+        <div id="progress"></div>
         <div class="output" id="log">
             {{ stream|safe }}
         </div>
         <script>
             const logDiv = document.getElementById("log");
-            const eventSource = new EventSource("/stream?query={{ query }}");
+            const progressDiv = document.getElementById("progress");
+            const rows = {};
+            const eventSource = new EventSource("/stream?job={{ job_id }}");
 
-            eventSource.onmessage = function(event) {
-                logDiv.innerHTML += event.data + "\\n";
+            function log(line) {
+                logDiv.appendChild(document.createTextNode(line + "\\n"));
                 logDiv.scrollTop = logDiv.scrollHeight;
+            }
+
+            function retailerRow(name) {
+                if (!rows[name]) {
+                    const row = document.createElement("div");
+                    row.className = "retailer";
+                    row.innerHTML = '<span class="name"></span><div class="bar"><div class="fill"></div></div><span class="stats"></span>';
+                    row.querySelector(".name").textContent = name;
+                    progressDiv.appendChild(row);
+                    rows[name] = row;
+                }
+                return rows[name];
+            }
+
+            // Every event but log carries the run's counters; pages with a known total fill the bar
+            function showProgress(e) {
+                const row = retailerRow(e.retailer);
+                const fill = row.querySelector(".fill");
+                if (e.total_pages) {
+                    fill.style.width = Math.min(100, 100 * e.pages / e.total_pages) + "%";
+                }
+                if (e.type === "finished") {
+                    fill.style.width = "100%";
+                    if (!e.ok || e.cancelled) fill.classList.add("stopped");
+                }
+                if (e.pages !== undefined) {
+                    row.querySelector(".stats").textContent =
+                        e.items + " products, " + e.pages + " pages in " + e.elapsed.toFixed(0) + "s (" +
+                        e.items_per_sec.toFixed(1) + " products/s, " + e.pages_per_sec.toFixed(2) + " pages/s)" +
+                        (e.cached ? " - cached" : "");
+                }
+            }
+
+            eventSource.onmessage = function(event) {
+                const e = JSON.parse(event.data);
+                if (e.type === "log") {
+                    log(e.retailer ? "[" + e.retailer + "] " + e.line : e.line);
+                    return;
+                }
+                showProgress(e);
+                if (e.cached) return;
+                if (e.type === "job_started") {
+                    log("▶️ Running " + e.retailer + " scraper...");
+                } else if (e.type === "saved") {
+                    log("[" + e.retailer + "] 💾 Saved " + e.rows + " products to " + e.path);
+                } else if (e.type === "finished") {
+                    const products = " (" + (e.items || 0) + " products)";
+                    if (e.cancelled) {
+                        log("🛑 " + e.retailer + " scraper cancelled, partial results saved" + products);
+                    } else if (e.ok) {
+                        log("✅ " + e.retailer + " scraper completed" + products);
+                    } else {
+                        log("❌ " + e.retailer + " scraper failed: " + e.error + products);
+                    }
+                }
             };
 
+            // The browser reconnects by itself and sends Last-Event-ID, so the log picks up where it stopped
             eventSource.onerror = function() {
-                logDiv.innerHTML += "\\n❌ Stream connection lost.";
-                eventSource.close();
+                if (eventSource.readyState === EventSource.CLOSED) {
+                    log("❌ Stream connection lost.");
+                } else {
+                    log("⚠️ Connection interrupted, reconnecting...");
+                }
             };
+
+            eventSource.addEventListener("end", function() {
+                eventSource.close();
+            });
         </script>
         {% endif %}
     </div>
@@ -97,40 +224,219 @@ HTML = """
 
 @app.route("/", methods=["GET"])
 def index():
-    return render_template_string(HTML, stream=False)
+    job = jobs.get_job(request.args.get("job", ""))
+    if job is None:
+        return render_template_string(HTML, stream=False)
+    return render_template_string(HTML, stream=True, query=job.query, job_id=job.id)
 
 @app.route("/run", methods=["POST"])
 def run_scrapers():
     query = request.form.get("query", "").strip()
-    return render_template_string(HTML, stream=True, query=query)
+    job, created = submit_search(query, cancel_when_abandoned=True)
+    # Redirect so that reloading the page re-attaches to this job instead of re-submitting the form
+    return redirect(url_for("index", job=job.id), code=303)
+
+def load_scraper(name):
+    """Import a retailer's scraper module the first time it is needed; later runs reuse it."""
+    with scraper_modules_lock:
+        module = scraper_modules.get(name)
+        if module is None:
+            module = scraper_modules[name] = importlib.import_module(scrapers[name])
+        return module
+
+def run_scraper(name, query, emit, job=None):
+    """
+    Run one scraper in-process, passing its progress events (tagged with the retailer) to emit().
+    Successful runs that found products are cached. If `job` is cancelled, the scraper stops at its next page or
+    scroll and saves what it has.
+    """
+    transcript = []
+    ok = False
+    found = 0
+    cancel = threading.Event()
+    if job is not None:
+        job.add_cancel_hook(cancel.set)
+    try:
+        for event in load_scraper(name).scrape(query, {"cancel": cancel, "retailer": name}):
+            event["retailer"] = name
+            metrics.record_event(name, event)
+            if event["type"] == "log":
+                event["line"] = event["line"].strip()
+            elif event["type"] == "products_batch" and job is not None:
+                job.add_products(name, event["count"])
+            elif event["type"] == "finished":
+                ok = event["ok"] and not event["cancelled"]
+                found = event.get("items", 0)
+            if job is not None:
+                job.update_progress(name, event)
+            transcript.append(event)
+            emit(event)
+        # An empty result is as likely a block page or a selector change as a real "no products"
+        if ok and found:
+            results.put(name, query, transcript)
+        return ok
+    except Exception as e:
+        event = {"type": "finished", "retailer": name, "ok": False, "error": str(e), "cancelled": False}
+        metrics.record_event(name, event)
+        emit(event)
+        return False
+    finally:
+        if job is not None:
+            job.remove_cancel_hook(cancel.set)
+
+def refresh_in_background(name, query):
+    """Queue a re-run for a scraper whose cached results are stale, without holding up the stream."""
+    key = ResultCache.key(name, query)
+    with refreshing_lock:
+        if key in refreshing:
+            return
+        refreshing.add(key)
+
+    def refresh():
+        try:
+            run_scraper(name, query, lambda event: None)
+        finally:
+            with refreshing_lock:
+                refreshing.discard(key)
+
+    scheduler.submit("background-refresh", name, refresh)
+
+def run_search(job, use_cache):
+    """Replay cached retailers and queue the rest, writing everything to the job's event log."""
+    query = job.query
+    done = queue.Queue()
+    queued = 0
+    for name in scrapers:
+        entry, state = results.get(name, query) if use_cache else (None, None)
+        if entry is not None:
+            job.set_retailer(name, "cached")
+            minutes = int(time.time() - entry["created"]) // 60
+            job.log(f"♻️ {name}: cached results from {minutes} min ago")
+            for event in entry["events"]:
+                event = {**event, "retailer": name, "cached": True}
+                if event["type"] == "products_batch":
+                    job.add_products(name, event["count"])
+                job.emit(event)
+            if state == STALE:
+                job.log(f"🔄 {name}: refreshing in the background")
+                refresh_in_background(name, query)
+            continue
+
+        def task(name=name):
+            if job.cancelled.is_set():
+                job.set_retailer(name, "cancelled")
+                done.put(name)
+                return
+            job.set_retailer(name, "running")
+            ok = False
+            try:
+                ok = run_scraper(name, query, job.emit, job)
+            finally:
+                if job.cancelled.is_set():
+                    job.set_retailer(name, "cancelled")
+                else:
+                    job.set_retailer(name, "completed" if ok else "failed")
+                done.put(name)
+
+        job.set_retailer(name, "queued")
+        scheduler.submit(job.user, name, task)
+        queued += 1
+
+    if queued:
+        job.log(f"⏳ Queued {queued} scrapers ({scheduler.queued()} waiting across all searches)")
+    for _ in range(queued):
+        done.get()
+
+    if job.cancelled.is_set():
+        job.log("🛑 Search cancelled.")
+    else:
+        job.log("🎉 All scrapers finished.")
+
+def submit_search(query, use_cache=True, cancel_when_abandoned=False):
+    """
+    Start a search job, or join the one already running for the same term (and the same use_cache).
+    The job runs on its own thread. Dashboard searches (cancel_when_abandoned) are stopped
+    once nobody is watching; API jobs carry on after the client disconnects.
+    """
+    user = request.remote_addr or "anonymous"
+    return jobs.start_or_attach(query, lambda job: run_search(job, use_cache), user=user,
+                                cancel_when_abandoned=cancel_when_abandoned, fresh=not use_cache)
+
+@app.route("/jobs", methods=["POST"])
+def create_job():
+    data = request.get_json(silent=True) or request.form
+    query = (data.get("query") or "").strip()
+    if not query:
+        return jsonify({"error": "query is required"}), 400
+    job, created = submit_search(query, use_cache=str(data.get("refresh", "")) != "1")
+    return jsonify({**job.to_dict(), "joined": not created}), 202
+
+@app.route("/jobs", methods=["GET"])
+def job_list():
+    return jsonify({
+        "jobs": [job.to_dict() for job in jobs.list_jobs()],
+        "queued": scheduler.queued(),
+        "running": scheduler.running(),
+    })
+
+@app.route("/jobs/<job_id>", methods=["GET"])
+def job_status(job_id):
+    job = jobs.get_job(job_id) or abort(404)
+    return jsonify(job.to_dict())
+
+@app.route("/jobs/<job_id>/cancel", methods=["POST"])
+def cancel_job(job_id):
+    job = jobs.get_job(job_id) or abort(404)
+    jobs.cancel(job)
+    return jsonify(job.to_dict()), 202
+
+@app.route("/jobs/<job_id>/events", methods=["GET"])
+def job_events(job_id):
+    """The job's events so far, from ?since=N on, for clients that poll instead of streaming."""
+    job = jobs.get_job(job_id) or abort(404)
+    since = request.args.get("since", 0, type=int)
+    return jsonify({"status": job.status, "since": since, "events": job.events[since:]})
+
+@app.route("/metrics")
+def metrics_endpoint():
+    """Scrape timings and throughput per retailer, in the Prometheus text format."""
+    return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
 
 @app.route("/stream")
 def stream():
-    query = request.args.get("query", "").strip()
+    job_id = request.args.get("job")
+    if job_id:
+        job, created = jobs.get_job(job_id) or abort(404), True
+    else:
+        # ?refresh=1 ignores cached results and scrapes everything again
+        query = request.args.get("query", "").strip()
+        job, created = submit_search(query, use_cache=request.args.get("refresh") != "1", cancel_when_abandoned=True)
+
+    # Event N is the job's Nth event, so a reconnecting client resumes right after the last one it saw
+    try:
+        resume_from = int(request.headers.get("Last-Event-ID") or request.args.get("last_event_id") or 0)
+    except ValueError:
+        resume_from = 0
 
     def generate():
-        for name, script in scrapers.items():
-            yield f"data: ▶️ Running {name} scraper...\n\n"
-            try:
-                process = subprocess.Popen(
-                    ["python", script],
-                    stdin=subprocess.PIPE,
-                    stdout=subprocess.PIPE,
-                    stderr=subprocess.STDOUT,
-                    text=True,
-                    bufsize=1
-                )
-                process.stdin.write(query + "\n")
-                process.stdin.flush()
-                for line in process.stdout:
-                    yield f"data: [{name}] {line.strip()}\n\n"
-                process.wait()
-                status = "✅ Completed" if process.returncode == 0 else "❌ Failed"
-                yield f"data: ✅ {name} scraper {status}\n\n"
-            except Exception as e:
-                yield f"data: ❌ {name} error: {str(e)}\n\n"
-
-        yield "data: 🎉 All scrapers finished.\n\n"
+        # Closing the tab ends this generator on the next write; the job is told it lost a viewer
+        jobs.subscribe(job)
+        try:
+            yield "retry: 3000\n\n"
+            if not created and not resume_from:
+                joined = {"type": "log", "retailer": None, "line": f"🔗 Joined the search for '{job.query}' already in progress"}
+                yield f"data: {json.dumps(joined, ensure_ascii=False)}\n\n"
+            event_id = resume_from
+            for event in job.follow(start=resume_from, idle=SSE_HEARTBEAT):
+                if event is None:
+                    yield ": heartbeat\n\n"
+                    continue
+                event_id += 1
+                yield f"id: {event_id}\ndata: {json.dumps(event, ensure_ascii=False)}\n\n"
+            # Tells the dashboard to stop reconnecting
+            yield f"id: {event_id}\nevent: end\ndata: {job.status}\n\n"
+        finally:
+            jobs.unsubscribe(job)
 
     return Response(generate(), mimetype="text/event-stream")
 
@@ -1,22 +1,49 @@
-import time
+import os
 import pandas as pd
 from selenium import webdriver
 from selenium.webdriver.common.by import By
 from selenium.webdriver.chrome.options import Options
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
-from selenium.common.exceptions import TimeoutException
 from datetime import datetime
 import signal
 import sys
 import atexit
-from urllib.parse import quote_plus
+from urllib.parse import quote_plus, urljoin
+import driver_pool
+from fanout import fan_out, worker_count
+from extraction import field, compile_extractor
+from waits import wait_for_dom_quiet
+from politeness import polite_get, throttle
+import fetcher
+from dedup import DedupIndex, persist_path
+from journal import CheckpointJournal
+import excel_writer
+import parquet_store
+import progress
+import recorder
+import metrics
+
+# Point at another host (e.g. benchmarks/simulator.py) with ASDA_BASE_URL
+BASE_URL = os.environ.get("ASDA_BASE_URL", "https://groceries.asda.com").rstrip("/")
+HOME_URL = f"{BASE_URL}/"
+
+LAST_PAGE_SELECTOR = "a.asda-link.asda-link--primary.co-pagination__last-page"
+PRODUCT_TILE = "li.co-item.co-item--rest-in-shelf"
+PRODUCT_FIELDS = {
+    "Name": field("h3.co-product__title a", default=None),
+    "URL": field("h3.co-product__title a", "href", default=None),
+    "Price": field("strong.co-product__price", default=None),
+    "Unit Price": field("span.co-product__price-per-uom", default=None),
+}
+extract_products = compile_extractor(PRODUCT_TILE, PRODUCT_FIELDS)
 
 # Globals
 emergency_data = []
 emergency_filename_base = ""
 emergency_driver = None
 
+@metrics.timed("save")
 def save_data_batch(data_to_save, base_filename):
     if not data_to_save:
         print("No data to save.")
@@ -27,19 +54,15 @@ def save_data_batch(data_to_save, base_filename):
     excel_filename = f"{base_filename}.xlsx"
 
     try:
-        df.to_csv(csv_filename, mode='a', index=False, encoding='utf-8-sig', header=not pd.io.common.file_exists(csv_filename))
-        print(f"Appended to CSV: {csv_filename}")
+        # Called with the whole run's rows, so a same-day rerun replaces the file instead of doubling it
+        df.to_csv(csv_filename, index=False, encoding='utf-8-sig')
+        print(f"Saved CSV: {csv_filename}")
+        progress.saved(csv_filename, len(df))
     except Exception as e:
         print(f"CSV save failed: {e}")
 
-    try:
-        if pd.io.common.file_exists(excel_filename):
-            existing_df = pd.read_excel(excel_filename)
-            df = pd.concat([existing_df, df]).drop_duplicates(subset=["URL"])
-        df.to_excel(excel_filename, index=False)
-        print(f"Updated Excel: {excel_filename}")
-    except Exception as e:
-        print(f"Excel save failed: {e}")
+    excel_writer.submit(df, excel_filename)  # Written on the background thread
+    print(f"Queued Excel export: {excel_filename}")
     return True
 
 def emergency_save(signum=None, frame=None):
@@ -53,11 +76,36 @@ def emergency_save(signum=None, frame=None):
             emergency_driver.quit()
         except:
             pass
+    excel_writer.flush()
     sys.exit(0)
 
+def create_driver():
+    options = Options()
+    options.add_argument("--headless")
+    options.add_argument("--window-size=1920,1080")
+    recorder.configure(options)
+    return webdriver.Chrome(options=options)
+
+@metrics.timed("cookie_consent")
+def accept_cookies(driver):
+    try:
+        WebDriverWait(driver, 15).until(EC.element_to_be_clickable((By.ID, "onetrust-accept-btn-handler"))).click()
+        print("Accepted cookies.")
+        wait_for_dom_quiet(driver, timeout=5)
+    except:
+        print("Cookie button not shown or already accepted.")
+
+def warm_up(driver):
+    """Open the home page and accept cookies so pooled sessions start ready to search."""
+    polite_get(driver, HOME_URL)
+    accept_cookies(driver)
+
+def get_driver_pool():
+    return driver_pool.get_pool("Asda", create_driver, warm_up)
+
 def get_last_page(driver, wait):
     try:
-        last_page_el = wait.until(EC.presence_of_element_located((By.CSS_SELECTOR, "a.asda-link.asda-link--primary.co-pagination__last-page")))
+        last_page_el = wait.until(EC.presence_of_element_located((By.CSS_SELECTOR, LAST_PAGE_SELECTOR)))
         last_page = int(last_page_el.text.strip())
         print(f"Last page detected: {last_page}")
         return last_page
@@ -65,84 +113,135 @@ def get_last_page(driver, wait):
         print("Could not detect last page. Defaulting to 1.")
         return 1
 
-def scrape_page(driver, wait):
-    products = []
-    wait.until(EC.presence_of_all_elements_located((By.CSS_SELECTOR, "li.co-item.co-item--rest-in-shelf")))
-    time.sleep(2)
+def to_record(item):
+    return {
+        "Name": item["Name"],
+        "Price": item["Price"],
+        "Unit Price": item["Unit Price"],
+        "URL": urljoin(HOME_URL, item["URL"]),  # href is usually absolute already
+        "Scraped At": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    }
 
-    product_elements = driver.find_elements(By.CSS_SELECTOR, "li.co-item.co-item--rest-in-shelf")
-    for item in product_elements:
-        try:
-            name = item.find_element(By.CSS_SELECTOR, "h3.co-product__title a").text.strip()
-            link = "https://groceries.asda.com" + item.find_element(By.CSS_SELECTOR, "h3.co-product__title a").get_attribute("href")
-            price = item.find_element(By.CSS_SELECTOR, "strong.co-product__price").text.strip()
-            price_per = item.find_element(By.CSS_SELECTOR, "span.co-product__price-per-uom").text.strip()
-
-            products.append({
-                "Name": name,
-                "Price": price,
-                "Unit Price": price_per,
-                "URL": link,
-                "Scraped At": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            })
-            time.sleep(1)
-        except Exception as e:
-            print(f"Error parsing item: {e}")
-            continue
-    return products
-
-def scrape_asda_products():
-    query = input("Search for: ").strip() or "milk"
+def scrape_page(driver, wait):
+    with metrics.phase("wait"):
+        wait.until(EC.presence_of_all_elements_located((By.CSS_SELECTOR, PRODUCT_TILE)))
+    wait_for_dom_quiet(driver, timeout=2)  # Let late-rendering prices settle
+
+    # One round trip for every tile on the page
+    return [to_record(item) for item in extract_products(driver)]
+
+def scrape_page_http(page_url):
+    """
+    Fast path: read a results page over plain HTTP.
+    Returns (products, last_page), or None when the page needs a browser to render.
+    """
+    throttle(page_url)
+    page = fetcher.fetch_page(page_url)
+    if page is None:
+        return None
+    items = page.products(PRODUCT_TILE, PRODUCT_FIELDS)
+    if not items:
+        return None
+    try:
+        last_page = int(page.text(LAST_PAGE_SELECTOR, "1"))
+    except ValueError:
+        last_page = 1
+    return [to_record(item) for item in items], last_page
+
+def scrape_asda_products(query=None):
+    if query is None:
+        query = input("Search for: ")
+    query = query.strip() or "milk"
     encoded_query = quote_plus(query)
     base_filename = f"asda_{query.replace(' ', '_')}_{datetime.now().strftime('%Y%m%d')}"
 
     global emergency_data, emergency_filename_base, emergency_driver
     emergency_filename_base = base_filename
-    signal.signal(signal.SIGINT, emergency_save)
-    signal.signal(signal.SIGTERM, emergency_save)
-    atexit.register(emergency_save)
 
-    options = Options()
-    options.add_argument("--headless")
-    options.add_argument("--window-size=1920,1080")
-    driver = webdriver.Chrome(options=options)
-    emergency_driver = driver
-    wait = WebDriverWait(driver, 15)
-
-    # Load first page to get total pages
-    url = f"https://groceries.asda.com/search/{encoded_query}"
-    driver.get(url)
-
-    try:
-        wait.until(EC.element_to_be_clickable((By.ID, "onetrust-accept-btn-handler"))).click()
-        print("Accepted cookies.")
-        time.sleep(5)
-    except:
-        print("Cookie button not shown or already accepted.")
+    pool = get_driver_pool()
+    url = f"{BASE_URL}/search/{encoded_query}"
+    page_url = f"{BASE_URL}/search/{encoded_query}/products?page={{}}"
+
+    # Try plain HTTP first; the browser is only checked out if the page needs JavaScript
+    first_page = scrape_page_http(page_url.format(1)) if fetcher.enabled() else None
+    use_http = first_page is not None
+    if use_http:
+        last_page = first_page[1]
+        print(f"Using HTTP fast path. Last page detected: {last_page}")
+    else:
+        # Load first page to get total pages. The session goes back to the pool
+        # straight after, ready for the page workers (already warmed up with cookies accepted).
+        with pool.session() as driver:
+            polite_get(driver, url)
+            last_page = get_last_page(driver, WebDriverWait(driver, 15))
 
-    last_page = get_last_page(driver, wait)
     all_data = []
+    emergency_data = all_data  # Shared reference, nothing to copy per page
+    seen = DedupIndex(persist_path("asda"))
+    journal = CheckpointJournal(base_filename)
+    store = parquet_store.open_writer("asda", query)  # None unless PARQUET_STORE_DIR is set
+
+    def add_page(page, page_data):
+        page_data = seen.filter_new(page_data)
+        print(f"Found {len(page_data)} products on page {page}")
+        progress.page_loaded(page, last_page)
+        all_data.extend(page_data)
+        journal.append(page_data)  # Only the new rows hit the disk
+        progress.products(page_data)
+        if store:
+            store.write_batch(page_data)
+
+    def scrape_url(paginated_url):
+        nonlocal use_http
+        print(f"\n Loading {paginated_url}")
+        if use_http:
+            fetched = scrape_page_http(paginated_url)
+            if fetched:
+                return fetched[0]
+            print("HTTP fast path returned no products, switching to the browser.")
+            use_http = False
+        with pool.session() as session:
+            polite_get(session, paginated_url)
+            return scrape_page(session, WebDriverWait(session, 15))
 
-    for page in range(1, last_page + 1):
-        paginated_url = f"https://groceries.asda.com/search/{encoded_query}/products?page={page}"
-        print(f"\n Loading Page {page}/{last_page}: {paginated_url}")
-        driver.get(paginated_url)
-        time.sleep(5)
-
-        try:
-            page_data = scrape_page(driver, wait)
-            print(f"Found {len(page_data)} products on page {page}")
-            all_data.extend(page_data)
-            emergency_data = all_data.copy()
-            save_data_batch(page_data, base_filename)
-        except Exception as e:
-            print(f"Error scraping page {page}: {e}")
-            continue
-
-    atexit.unregister(emergency_save)
-    driver.quit()
+    try:
+        start_page = 1
+        if first_page:
+            add_page(1, first_page[0])
+            start_page = 2
+
+        # Pages are addressable by URL, so several load at once and are merged back in page order
+        page_urls = [page_url.format(page) for page in range(start_page, last_page + 1)]
+        workers = worker_count(pool)
+        if workers > 1 and len(page_urls) > 1:
+            print(f"Scraping {len(page_urls)} pages, {workers} at a time...")
+        for page, (paginated_url, page_data) in enumerate(fan_out(page_urls, scrape_url, workers), start=start_page):
+            if progress.cancelled():
+                print("Search cancelled, saving what we have.")
+                break
+            if page_data is None:
+                print(f"Error scraping page {page}/{last_page}, skipping.")
+                continue
+            add_page(page, page_data)
+    finally:
+        # Save whatever was read, even if a page blew up the run
+        journal.close()
+        if store:
+            store.close()
+        print(f"Writing CSV/Excel from {len(all_data)} scraped rows...")
+        save_data_batch(all_data, base_filename)
+        atexit.unregister(emergency_save)
+        seen.close()
     print(f"Finished scraping {len(all_data)} total items.")
 
+# app.py runs this in-process; it yields log lines and product batches (see progress.run)
+def scrape(query, options=None):
+    return progress.run(scrape_asda_products, query, options)
+
 if __name__ == "__main__":
+    # Emergency save on Ctrl+C or kill only applies to command-line runs
+    signal.signal(signal.SIGINT, emergency_save)
+    signal.signal(signal.SIGTERM, emergency_save)
+    atexit.register(emergency_save)
     print("ASDA Scraper with Pagination\nPress Ctrl+C to interrupt safely.\n")
     scrape_asda_products()
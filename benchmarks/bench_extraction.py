@@ -0,0 +1,266 @@
+"""
+Offline benchmark of each retailer's extraction path against the HTML fixtures in benchmarks/fixtures.
+
+    python benchmarks/bench_extraction.py --tiles 200 --rounds 5
+    python benchmarks/bench_extraction.py --retailers asda,ocado --baseline benchmarks/results/old.json
+
+Each fixture is served from a local HTTP server and loaded in headless Chrome, then the same
+code the scraper runs on a live results page reads it: Asda's extract_products and to_record, the
+compiled tile extractor for Co-op, Sainsbury's and Tesco, and the TileHarvester batch for Ocado and
+Morrisons. The HTTP fast path (BeautifulSoup) is timed on the same HTML. Page loads and waits for
+the page to settle are not counted.
+
+Reports products/sec, WebDriver commands per product and peak RSS, and writes everything to a
+JSON file (benchmarks/results/ by default). Install psutil for per-retailer browser memory.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import threading
+import importlib
+import statistics
+from collections import Counter
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from selenium import webdriver
+from selenium.webdriver.chrome.options import Options
+
+import fetcher
+from dedup import DedupIndex
+from harvest import TileHarvester
+from fixture_server import FixtureServer, render_fixture, fixture_names
+
+# Optional: peak memory of this process comes from resource (Unix) and the browser's from psutil
+try:
+    import resource
+except ImportError:
+    resource = None
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+
+
+def _asda(module, driver):
+    # scrape_page minus its waits, which would time the fixture's render rather than the extraction
+    return [module.to_record(item) for item in module.extract_products(driver)]
+
+
+def _tile_extractor(module, driver):
+    return module.extract_products(driver)
+
+
+def _ocado(module, driver):
+    harvester = TileHarvester(driver, module.PRODUCT_TILE, module.PRODUCT_FIELDS, module.HOME_URL)
+    return module.scrape_current_products(harvester.collect(), 1, DedupIndex())
+
+
+def _harvest(module, driver):
+    return TileHarvester(driver, module.PRODUCT_TILE, module.PRODUCT_FIELDS, module.HOME_URL).collect()
+
+
+# fixture name -> (scraper module, extraction path as the scraper runs it on one page)
+RETAILERS = {
+    "asda": ("asda_scraper", _asda),
+    "coop": ("coop_scraper_v2", _tile_extractor),
+    "ocado": ("ocado_scraper", _ocado),
+    "morrisons": ("morrisons_scraper", _harvest),
+    "sainsburys": ("sainsburys_scraper", _tile_extractor),
+    "tesco": ("tesco_scraper", _tile_extractor),
+}
+
+
+class CommandCounter:
+    """Counts the WebDriver commands a driver sends, including those from its WebElements."""
+
+    def __init__(self, driver):
+        self.counts = Counter()
+        self._execute = driver.execute
+        driver.execute = self._counting_execute
+
+    def _counting_execute(self, driver_command, params=None):
+        self.counts[driver_command] += 1
+        return self._execute(driver_command, params)
+
+    def take(self):
+        counts, self.counts = self.counts, Counter()
+        return counts
+
+
+class MemorySampler:
+    """Tracks peak resident memory of this process and of the browser (with psutil) between reset() calls."""
+
+    def __init__(self, browser_pid=None, interval=0.05):
+        self.interval = interval
+        self._self = psutil.Process() if psutil else None
+        self._browser = psutil.Process(browser_pid) if psutil and browser_pid else None
+        self.reset()
+        threading.Thread(target=self._sample, daemon=True).start()
+
+    def reset(self):
+        self.peak_python = 0
+        self.peak_browser = 0
+
+    def _browser_rss(self):
+        total = 0
+        for proc in [self._browser] + self._browser.children(recursive=True):
+            try:
+                total += proc.memory_info().rss
+            except psutil.Error:
+                pass
+        return total
+
+    def _sample(self):
+        while self._self is not None:
+            self.peak_python = max(self.peak_python, self._self.memory_info().rss)
+            if self._browser is not None:
+                self.peak_browser = max(self.peak_browser, self._browser_rss())
+            time.sleep(self.interval)
+
+    def peaks_mb(self):
+        python = self.peak_python
+        if not python and resource is not None:
+            # Lifetime peak of the whole run; kilobytes on Linux, bytes on macOS
+            python = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * (1 if sys.platform == "darwin" else 1024)
+        return {
+            "python": round(python / 2**20, 1) if python else None,
+            "browser": round(self.peak_browser / 2**20, 1) if self.peak_browser else None,
+        }
+
+
+def create_driver():
+    options = Options()
+    options.add_argument("--headless=new")
+    options.add_argument("--window-size=1920,1080")
+    return webdriver.Chrome(options=options)
+
+
+def _rates(products, seconds):
+    return {
+        "products": products,
+        "seconds": round(seconds, 4),
+        "products_per_sec": round(products / seconds, 1) if seconds > 0 else None,
+    }
+
+
+def bench_browser(module, extract, driver, counter, url, rounds):
+    timings, loads, products, commands = [], [], 0, Counter()
+    for _ in range(rounds):
+        start = time.perf_counter()
+        driver.get(url)  # A fresh page every round: the harvester only reads untagged tiles
+        loads.append(time.perf_counter() - start)
+        counter.take()
+        start = time.perf_counter()
+        rows = extract(module, driver)
+        timings.append(time.perf_counter() - start)
+        commands += counter.take()
+        products = len(rows)
+    seconds = statistics.median(timings)
+    calls = sum(commands.values()) / rounds
+    return {
+        **_rates(products, seconds),
+        "webdriver_calls": calls,
+        "calls_per_product": round(calls / products, 3) if products else None,
+        "commands": {command: count / rounds for command, count in commands.most_common()},
+        "page_load_seconds": round(statistics.median(loads), 4),
+    }
+
+
+def bench_http(module, html, url, rounds):
+    if not fetcher.enabled():
+        return None
+    timings, products = [], 0
+    for _ in range(rounds):
+        start = time.perf_counter()
+        rows = fetcher.FetchedPage(url, 200, html).products(module.PRODUCT_TILE, module.PRODUCT_FIELDS)
+        timings.append(time.perf_counter() - start)
+        products = len(rows)
+    return _rates(products, statistics.median(timings))
+
+
+def run(retailers, tiles, rounds):
+    report = {
+        "started": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "tiles": tiles,
+        "rounds": rounds,
+        "results": {},
+    }
+    driver = create_driver()
+    counter = CommandCounter(driver)
+    service = getattr(driver, "service", None)
+    memory = MemorySampler(service.process.pid if service and service.process else None)
+    report["browser"] = driver.capabilities.get("browserVersion")
+    try:
+        with FixtureServer() as server:
+            for name in retailers:
+                module_name, extract = RETAILERS[name]
+                module = importlib.import_module(module_name)
+                url = server.url(name, tiles)
+                print(f"{name}: {tiles} tiles x {rounds} rounds...")
+                memory.reset()
+                result = {
+                    "module": module_name,
+                    "browser": bench_browser(module, extract, driver, counter, url, rounds),
+                    "http": bench_http(module, render_fixture(name, tiles), url, rounds),
+                }
+                result["peak_rss_mb"] = memory.peaks_mb()
+                if result["browser"]["products"] != tiles:
+                    print(f"  Warning: read {result['browser']['products']} of {tiles} tiles; the fixture may not match the scraper's selectors.")
+                report["results"][name] = result
+    finally:
+        driver.quit()
+    return report
+
+
+def print_report(report, baseline=None):
+    print(f"\n{'retailer':<12}{'products/s':>12}{'http/s':>12}{'calls/product':>15}{'rss MB':>10}{'vs baseline':>13}")
+    for name, result in report["results"].items():
+        browser, http = result["browser"], result["http"] or {}
+        change = ""
+        old = ((baseline or {}).get("results", {}).get(name) or {}).get("browser", {}).get("products_per_sec")
+        if old and browser["products_per_sec"]:
+            change = f"{(browser['products_per_sec'] - old) / old:+.0%}"
+        print(f"{name:<12}{browser['products_per_sec'] or 0:>12}{http.get('products_per_sec') or '-':>12}"
+              f"{browser['calls_per_product'] or '-':>15}{result['peak_rss_mb']['python'] or '-':>10}{change:>13}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark each retailer's product extraction against local fixtures.")
+    parser.add_argument("--retailers", default=",".join(RETAILERS), help="comma-separated subset of: " + ", ".join(RETAILERS))
+    parser.add_argument("--tiles", type=int, default=48, help="product tiles per fixture page")
+    parser.add_argument("--rounds", type=int, default=5, help="page loads per retailer; the median is reported")
+    parser.add_argument("--output", help="where to write the JSON report (default: benchmarks/results/extraction-<time>.json)")
+    parser.add_argument("--baseline", help="an earlier JSON report to compare products/sec against")
+    args = parser.parse_args()
+
+    retailers = [name.strip() for name in args.retailers.split(",") if name.strip()]
+    unknown = [name for name in retailers if name not in RETAILERS or name not in fixture_names()]
+    if unknown:
+        parser.error(f"no benchmark for {', '.join(unknown)}")
+
+    report = run(retailers, args.tiles, args.rounds)
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+    print_report(report, baseline)
+
+    output = args.output or os.path.join(RESULTS_DIR, f"extraction-{datetime.now().strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nReport written to {output}")
+
+
+if __name__ == "__main__":
+    main()
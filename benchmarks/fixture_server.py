@@ -0,0 +1,93 @@
+import os
+import re
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+
+# Serves benchmarks/fixtures/<retailer>.html on localhost. A fixture can mark one product
+# tile with <!-- tile --> ... <!-- /tile -->; that block is repeated ?tiles=N times with {i}
+# replaced by the tile number, so one small file stands in for a results page of any size.
+# Fixtures without the markers (e.g. a results page saved from the live site) are served as-is.
+
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+DEFAULT_TILES = 48
+
+_TILE_BLOCK = re.compile(r"<!-- tile -->(.*?)<!-- /tile -->", re.S)
+
+
+def fixture_names():
+    return sorted(name[:-5] for name in os.listdir(FIXTURE_DIR) if name.endswith(".html"))
+
+
+def _read_fixture(name):
+    with open(os.path.join(FIXTURE_DIR, f"{name}.html"), encoding="utf-8") as f:
+        return f.read()
+
+
+def tile_template(name):
+    """The marked tile block of a fixture, with {i} where the tile number goes."""
+    match = _TILE_BLOCK.search(_read_fixture(name))
+    if match is None:
+        raise ValueError(f"Fixture {name!r} has no <!-- tile --> block")
+    return match.group(1)
+
+
+def render_tiles(template, numbers):
+    return "".join(template.replace("{i}", str(i)) for i in numbers)
+
+
+def render_fixture(name, tiles=DEFAULT_TILES):
+    return _TILE_BLOCK.sub(lambda m: render_tiles(m.group(1), range(1, tiles + 1)), _read_fixture(name))
+
+
+class _FixtureHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        url = urlparse(self.path)
+        name = url.path.strip("/").split("/")[0]
+        if name not in fixture_names():
+            self.send_error(404, f"No fixture named {name!r}")
+            return
+        tiles = int(parse_qs(url.query).get("tiles", [DEFAULT_TILES])[0])
+        body = render_fixture(name, tiles).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass  # Keep benchmark output readable
+
+
+class FixtureServer:
+    """
+    The fixture server on a background thread, bound to a free port:
+
+        with FixtureServer() as server:
+            driver.get(server.url("asda", tiles=200))
+    """
+
+    def __init__(self, host="127.0.0.1", port=0):
+        self.httpd = ThreadingHTTPServer((host, port), _FixtureHandler)
+        self.httpd.daemon_threads = True
+        self.base_url = f"http://{host}:{self.httpd.server_address[1]}"
+
+    def url(self, name, tiles=DEFAULT_TILES):
+        return f"{self.base_url}/{name}?tiles={tiles}"
+
+    def __enter__(self):
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+if __name__ == "__main__":
+    server = FixtureServer(port=int(os.environ.get("FIXTURE_PORT", 8765)))
+    print(f"Serving {', '.join(fixture_names())} on {server.base_url}/<retailer>?tiles=N (Ctrl+C to stop)")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,260 @@
+"""
+Synthetic retailer sites for load-testing the scrapers without touching the real ones.
+
+    python benchmarks/simulator.py --catalog 100000 --page-size 60 --latency 0.05
+
+Every search returns the whole synthetic catalog, using each site's own mechanics:
+
+    asda        /asda/search/<q>, then /products?page=N, with a last-page link
+    coop        /coop/search?query=<q>&page=N, following a.pagination--next
+    tesco       /tesco/groceries/en-GB/search?query=<q>&page=N, numbered links plus a Next link
+    sainsburys  /sainsburys/gol-ui/SearchResults/<q>?page=N, with an ln-c-pagination bar
+    ocado       /ocado/search?entry=<q>, infinite scroll that stops every few batches at button.show-more
+    morrisons   /morrisons/search?q=<q>, infinite scroll until the catalog runs out
+
+Each home page shows the OneTrust cookie button so pooled sessions warm up as usual.
+Tiles reuse the markup of benchmarks/fixtures, so they match the scrapers' selectors.
+Point a scraper at the simulator with its base URL variable, e.g.
+ASDA_BASE_URL=http://127.0.0.1:8800/asda (--print-env lists them all). Raise POLITENESS_RATE
+as well, or the crawl-rate limiter will dominate the timings.
+"""
+import os
+import sys
+import time
+import argparse
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs, quote
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fixture_server import tile_template, render_tiles
+
+RETAILERS = ("asda", "coop", "tesco", "sainsburys", "ocado", "morrisons")
+ENV_VARS = {name: f"{name.upper()}_BASE_URL" for name in RETAILERS}
+
+_PAGE = """<!DOCTYPE html>
+<html>
+<head><meta charset="utf-8"><title>{title}</title></head>
+<body>
+{body}
+</body>
+</html>
+"""
+
+_COOKIE_BANNER = """<div id="onetrust-banner-sdk">
+  <p>We use cookies.</p>
+  <button id="onetrust-accept-btn-handler" onclick="document.getElementById('onetrust-banner-sdk').remove()">Accept all cookies</button>
+</div>"""
+
+# Appends the next batch of tiles (fetched as an HTML fragment) when the page is scrolled
+# near the bottom. With autoBatches set, auto-loading pauses after that many batches until
+# the Show more button is clicked, like Ocado.
+_SCROLL_JS = """<script>
+(function () {
+    var list = document.getElementById("results");
+    var offset = %(offset)d, total = %(total)d, pageSize = %(page_size)d, autoBatches = %(auto_batches)d;
+    var fragmentUrl = "%(fragment_url)s", loading = false, loaded = 0;
+    var showMore = document.querySelector("button.show-more");
+
+    function update() {
+        if (showMore) showMore.style.display = autoBatches && loaded >= autoBatches && offset < total ? "" : "none";
+    }
+    function load() {
+        if (loading || offset >= total) return;
+        loading = true;
+        fetch(fragmentUrl + "&offset=" + offset).then(function (r) { return r.text(); }).then(function (html) {
+            list.insertAdjacentHTML("beforeend", html);
+            offset += pageSize;
+            loaded += 1;
+            loading = false;
+            update();
+        });
+    }
+    window.addEventListener("scroll", function () {
+        var root = document.scrollingElement || document.documentElement;
+        if (window.innerHeight + window.pageYOffset >= root.scrollHeight - 600 && !(autoBatches && loaded >= autoBatches)) load();
+    });
+    if (showMore) showMore.addEventListener("click", function () { loaded = 0; load(); });
+    update();
+})();
+</script>"""
+
+
+class Simulator:
+    """Catalog and site settings shared by every request handler."""
+
+    def __init__(self, catalog=1000, page_size=48, latency=0.0, show_more_every=3):
+        self.catalog = catalog
+        self.page_size = page_size
+        self.latency = latency
+        self.show_more_every = show_more_every
+        self._templates = {}
+        self._lock = threading.Lock()
+
+    @property
+    def last_page(self):
+        return max(1, -(-self.catalog // self.page_size))
+
+    def tiles(self, name, offset, count=None):
+        count = self.page_size if count is None else count
+        with self._lock:
+            template = self._templates.get(name)
+            if template is None:
+                template = self._templates[name] = tile_template(name)
+        return render_tiles(template, range(offset + 1, min(self.catalog, offset + count) + 1))
+
+    def page_tiles(self, name, page):
+        return self.tiles(name, (page - 1) * self.page_size)
+
+
+def _page(title, body):
+    return _PAGE.format(title=title, body=body)
+
+
+def _home(name):
+    return _page(f"{name} home", f"<h1>{name}</h1>\n{_COOKIE_BANNER}")
+
+
+def _page_number(query):
+    try:
+        return max(1, int(query.get("page", ["1"])[0]))
+    except ValueError:
+        return 1
+
+
+def render(sim, name, path, query):
+    """Return the HTML for a simulator URL (path without the /<retailer> prefix), or None for a 404."""
+    search = query.get("query", query.get("q", query.get("entry", [""])))[0]
+    if path in ("", "/") or path in ("/groceries/en-GB/", "/gol-ui/groceries"):
+        return _home(name)
+
+    if name == "asda" and path.startswith("/search/"):
+        term = path.split("/")[2]
+        page = _page_number(query) if path.endswith("/products") else 1
+        last = f'/asda/search/{term}/products?page={sim.last_page}'
+        return _page(f"{term} - Asda", (
+            f'<ul class="co-product-list__main-cntr">{sim.page_tiles(name, page)}</ul>\n'
+            f'<nav class="co-pagination"><a class="asda-link asda-link--primary co-pagination__last-page" href="{last}">{sim.last_page}</a></nav>'
+        ))
+
+    if name == "coop" and path == "/search":
+        page = _page_number(query)
+        next_link = ""
+        if page < sim.last_page:
+            next_link = f'<a class="pagination--next" href="/coop/search?query={quote(search)}&page={page + 1}">Next</a>'
+        return _page(f"{search} | Co-op", f'<ul class="search-results-list">{sim.page_tiles(name, page)}</ul>\n{next_link}')
+
+    if name == "tesco" and path == "/groceries/en-GB/search":
+        page = _page_number(query)
+        base = f"/tesco/groceries/en-GB/search?query={quote(search)}&page="
+        links = "".join(f'<a href="{base}{n}">{n}</a>' for n in sorted({1, page, page + 1, sim.last_page}) if n <= sim.last_page)
+        if page < sim.last_page:
+            links += f'<a data-auto="pagination-next" href="{base}{page + 1}">Next page</a>'
+        return _page(f"{search} - Tesco", f'<ul class="product-list grid">{sim.page_tiles(name, page)}</ul>\n<nav>{links}</nav>')
+
+    if name == "sainsburys" and path.startswith("/gol-ui/SearchResults/"):
+        term = path.split("/")[3]
+        page = _page_number(query)
+        base = f"/sainsburys/gol-ui/SearchResults/{term}?page="
+        items = []
+        for n in sorted({1, page - 1, page, page + 1, sim.last_page}):
+            if 1 <= n <= sim.last_page:
+                current = " ln-c-pagination__item--current" if n == page else ""
+                items.append(f'<li class="ln-c-pagination__item{current}"><a href="{base}{n}"><span>{n}</span></a></li>')
+        disabled = " ln-c-pagination__item--disabled" if page >= sim.last_page else ""
+        items.append(f'<li class="ln-c-pagination__item ln-c-pagination__item--next{disabled}"><a aria-label="Next page" href="{base}{min(page + 1, sim.last_page)}">Next</a></li>')
+        return _page(f"{term} | Sainsbury's", (
+            f'<ul class="ln-o-grid">{sim.page_tiles(name, page)}</ul>\n'
+            f'<ul class="ln-c-pagination__list">{"".join(items)}</ul>'
+        ))
+
+    if name in ("ocado", "morrisons") and path == "/search":
+        auto_batches = sim.show_more_every if name == "ocado" else 0
+        list_tag = "ul" if name == "ocado" else "div"
+        button = '<button class="btn-primary show-more" style="display:none">Show more</button>' if name == "ocado" else ""
+        script = _SCROLL_JS % {
+            "offset": sim.page_size,
+            "total": sim.catalog,
+            "page_size": sim.page_size,
+            "auto_batches": auto_batches,
+            "fragment_url": f"/{name}/fragment?q={quote(search)}",
+        }
+        return _page(f"{search} | {name}", f'<{list_tag} id="results">{sim.tiles(name, 0)}</{list_tag}>\n{button}\n{script}')
+
+    if name in ("ocado", "morrisons") and path == "/fragment":
+        try:
+            offset = int(query.get("offset", ["0"])[0])
+        except ValueError:
+            offset = 0
+        return sim.tiles(name, offset)
+
+    return None
+
+
+class _SimulatorHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        sim = self.server.simulator
+        url = urlparse(self.path)
+        name, _, rest = url.path.lstrip("/").partition("/")
+        html = render(sim, name, "/" + rest, parse_qs(url.query)) if name in RETAILERS else None
+        if sim.latency:
+            time.sleep(sim.latency)
+        if html is None:
+            self.send_error(404)
+            return
+        body = html.encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(simulator, host="127.0.0.1", port=8800):
+    """Start the simulator on a background thread. Returns (server, base_url); stop it with server.shutdown()."""
+    httpd = ThreadingHTTPServer((host, port), _SimulatorHandler)
+    httpd.daemon_threads = True
+    httpd.simulator = simulator
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    return httpd, f"http://{host}:{httpd.server_address[1]}"
+
+
+def base_urls(base_url):
+    """Environment overrides that send every scraper to the simulator at `base_url`."""
+    return {ENV_VARS[name]: f"{base_url}/{name}" for name in RETAILERS}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve synthetic versions of the retailer sites.")
+    parser.add_argument("--catalog", type=int, default=1000, help="products returned by every search")
+    parser.add_argument("--page-size", type=int, default=48, help="products per page or scroll batch")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every response")
+    parser.add_argument("--show-more-every", type=int, default=3, help="Ocado: scroll batches between Show more clicks")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8800)
+    parser.add_argument("--print-env", action="store_true", help="print the base URL variables and exit")
+    args = parser.parse_args()
+
+    if args.print_env:
+        for var, url in base_urls(f"http://{args.host}:{args.port}").items():
+            print(f"{var}={url}")
+        return
+
+    simulator = Simulator(args.catalog, args.page_size, args.latency, args.show_more_every)
+    httpd, base_url = serve(simulator, args.host, args.port)
+    print(f"Simulating {args.catalog} products, {args.page_size} per page, {args.latency}s latency on {base_url}")
+    for var, url in base_urls(base_url).items():
+        print(f"  {var}={url}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        httpd.shutdown()
+
+
+if __name__ == "__main__":
+    main()
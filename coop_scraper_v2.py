@@ -1,5 +1,5 @@
 
-import time
+import os
 import pandas as pd
 from selenium import webdriver
 from selenium.webdriver.common.by import By
@@ -12,11 +12,38 @@ import signal
 import sys
 import atexit
 from urllib.parse import quote_plus
+import driver_pool
+from extraction import field, compile_extractor
+from waits import wait_for_dom_quiet, wait_for_url_change
+from politeness import polite_get, polite_click, throttle
+import fetcher
+from dedup import DedupIndex, persist_path
+from journal import CheckpointJournal
+import excel_writer
+import parquet_store
+import progress
+import recorder
+import metrics
+
+# COOP_BASE_URL swaps in another host, such as the local simulator
+BASE_URL = os.environ.get("COOP_BASE_URL", "https://www.coop.co.uk").rstrip("/")
+HOME_URL = f"{BASE_URL}/"
+
+NEXT_PAGE = "a.pagination--next"
+PRODUCT_TILE = "li.search-results-list__item"
+PRODUCT_FIELDS = {
+    "Name": field("a.search-result__title", default=None),
+    "URL": field("a.search-result__title", "href", default=None),
+    "Description": field("p.coop-t-font-size-18", default=None),
+    "Image": field("img", "src", default=None),
+}
+extract_products = compile_extractor(PRODUCT_TILE, PRODUCT_FIELDS)
 
 emergency_data = []
 emergency_filename_base = ""
 emergency_driver = None
 
+@metrics.timed("save")
 def save_data_batch(data_to_save, base_filename, final=False):
     if not data_to_save:
         print("No data to save.")
@@ -29,13 +56,14 @@ def save_data_batch(data_to_save, base_filename, final=False):
     try:
         df.to_csv(csv_file, index=False, encoding="utf-8-sig")
         print(f" Saved CSV: {csv_file}")
+        progress.saved(csv_file, len(df))
     except Exception as e:
         print(f"CSV save failed: {e}")
 
     try:
         import openpyxl
-        df.to_excel(excel_file, index=False)
-        print(f" Saved Excel: {excel_file}")
+        excel_writer.submit(df, excel_file)  # Written on the background thread
+        print(f" Queued Excel export: {excel_file}")
     except Exception as e:
         print(f" Excel save failed: {e}")
     return True
@@ -51,19 +79,10 @@ def emergency_save(signum=None, frame=None):
             emergency_driver.quit()
         except:
             pass
+    excel_writer.flush()
     sys.exit(0)
 
-def scrape_coop_products():
-    query = input("Search for Co-op product: ").strip() or "milk"
-    encoded_query = quote_plus(query)
-    base_filename = f"coop_{query.replace(' ', '_')}_{datetime.now().strftime('%Y%m%d')}"
-
-    global emergency_data, emergency_filename_base, emergency_driver
-    emergency_filename_base = base_filename
-    signal.signal(signal.SIGINT, emergency_save)
-    signal.signal(signal.SIGTERM, emergency_save)
-    atexit.register(emergency_save)
-
+def create_driver():
     options = Options()
     options.add_argument("--headless=new")
     options.add_argument("--window-size=1920,1080")
@@ -73,85 +92,149 @@ def scrape_coop_products():
     options.add_argument("--disable-gpu")
     options.add_argument("--log-level=3")
     options.add_argument("--start-maximized")
+    recorder.configure(options)
+    return webdriver.Chrome(options=options)
 
-    driver = webdriver.Chrome(options=options)
-    emergency_driver = driver
-    wait = WebDriverWait(driver, 15)
-
-    url = f"https://www.coop.co.uk/search?query={encoded_query}"
-    print(f"Searching Co-op for: {query}")
-    print(f"Opening URL: {url}")
-    driver.get(url)
-
+@metrics.timed("cookie_consent")
+def accept_cookies(driver):
     try:
-        wait.until(EC.element_to_be_clickable((By.ID, "onetrust-accept-btn-handler"))).click()
+        WebDriverWait(driver, 15).until(EC.element_to_be_clickable((By.ID, "onetrust-accept-btn-handler"))).click()
         print("Accepted cookies.")
-        time.sleep(3)
+        wait_for_dom_quiet(driver, timeout=3)
     except:
         print("Cookie button not found or already accepted.")
 
+def warm_up(driver):
+    """Open the home page and accept cookies so pooled sessions start ready to search."""
+    polite_get(driver, HOME_URL)
+    accept_cookies(driver)
+
+def get_driver_pool():
+    return driver_pool.get_pool("Co-op", create_driver, warm_up)
+
+def scrape_coop_products(query=None):
+    if query is None:
+        query = input("Search for Co-op product: ")
+    query = query.strip() or "milk"
+    encoded_query = quote_plus(query)
+    base_filename = f"coop_{query.replace(' ', '_')}_{datetime.now().strftime('%Y%m%d')}"
+
+    global emergency_data, emergency_filename_base, emergency_driver
+    emergency_filename_base = base_filename
+
+    url = f"{BASE_URL}/search?query={encoded_query}"
+    print(f"Searching Co-op for: {query}")
+    print(f"Opening URL: {url}")
+
     all_data = []
-    seen_urls = set()
+    emergency_data = all_data  # Shared reference, nothing to copy per page
+    seen = DedupIndex(persist_path("coop"))
+    journal = CheckpointJournal(base_filename)
+    store = parquet_store.open_writer("coop", query)  # None unless PARQUET_STORE_DIR is set
 
-    def scrape_search_results():
-        nonlocal all_data
-        items = wait.until(EC.presence_of_all_elements_located((By.CSS_SELECTOR, "li.search-results-list__item")))
+    def add_items(items):
+        page_data = []
         for item in items:
-            try:
-                title_el = item.find_element(By.CSS_SELECTOR, "a.search-result__title")
-                name = title_el.text.strip()
-                url = title_el.get_attribute("href")
-                if url in seen_urls:
-                    continue
-                seen_urls.add(url)
-
-                try:
-                    price = "N/A"
-                    unit_price = "N/A"
-                    image = item.find_element(By.CSS_SELECTOR, "img").get_attribute("src").strip()
-                    description = item.find_element(By.CSS_SELECTOR, "p.coop-t-font-size-18").text.strip()
-                except Exception as e:
-                    print(f"Optional field missing: {e}")
-                    continue
-
-                all_data.append({
-                    "Name": name,
-                    "URL": url,
-                    "Price": price,
-                    "Unit Price": unit_price,
-                    "Description": description,
-                    "Image": image,
-                    "Scraped At": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                })
-
-                emergency_data[:] = all_data
-            except Exception as e:
-                print(f"Error scraping item: {e}")
-
-    while True:
-        scrape_search_results()
+            url = item["URL"]
+            if not seen.add(url):
+                continue
+
+            page_data.append({
+                "Name": item["Name"],
+                "URL": url,
+                "Price": "N/A",
+                "Unit Price": "N/A",
+                "Description": item["Description"],
+                "Image": item["Image"],
+                "Scraped At": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            })
+
+        progress.page_loaded()  # Co-op doesn't say how many pages there are
+        all_data.extend(page_data)
+        journal.append(page_data)
+        progress.products(page_data)
+        if store:
+            store.write_batch(page_data)
+
+    def scrape_search_results():
+        """Read the products on the loaded page. False if none turned up (no results, or a page that never rendered)."""
         try:
-            next_button = driver.find_element(By.CSS_SELECTOR, "a.pagination--next")
-            driver.execute_script("arguments[0].scrollIntoView(true);", next_button)
-            time.sleep(1)
-            next_button.click()
-            print("Clicked next page...")
-            time.sleep(3)
-        except:
+            with metrics.phase("wait"):
+                wait.until(EC.presence_of_all_elements_located((By.CSS_SELECTOR, PRODUCT_TILE)))
+        except TimeoutException:
+            print("No products appeared on the page.")
+            return False
+        try:
+            add_items(extract_products(driver))
+        except Exception as e:
+            print(f"Error extracting items: {e}")
+        return True
+
+    pool = get_driver_pool()
+    driver = None
+    try:
+        # Fast path: follow the result pages over plain HTTP while the static HTML has products
+        next_url = url
+        while next_url and fetcher.enabled() and not progress.cancelled():
+            throttle(next_url)
+            page = fetcher.fetch_page(next_url)
+            items = page.products(PRODUCT_TILE, PRODUCT_FIELDS) if page else []
+            if not items:
+                print("HTTP fast path returned no products, switching to the browser.")
+                break
+            add_items(items)
+            print(f"Fetched {len(items)} products over HTTP (Total: {len(all_data)})")
+            next_url = page.attr(NEXT_PAGE, "href")
+
+        if next_url:
+            driver = pool.checkout()  # Already warmed up with cookies accepted
+            emergency_driver = driver
+            wait = WebDriverWait(driver, 15)
+            polite_get(driver, next_url)
+        else:
             print("No more pages.")
-            break
 
-    print("Final save...")
-    save_data_batch(all_data, base_filename, final=True)
-    atexit.unregister(emergency_save)
-    driver.quit()
-    print("Browser closed.")
+        while driver is not None and not progress.cancelled():
+            if not scrape_search_results():
+                break
+            try:
+                next_button = driver.find_element(By.CSS_SELECTOR, NEXT_PAGE)
+                driver.execute_script("arguments[0].scrollIntoView(true);", next_button)
+                url_before = driver.current_url
+                polite_click(driver, next_button, url_before)
+                print("Clicked next page...")
+                wait_for_url_change(driver, url_before, timeout=5)
+                wait_for_dom_quiet(driver, timeout=3)
+            except:
+                print("No more pages.")
+                break
+    finally:
+        # Always runs, so a failed page still leaves the rows saved and the session back in the pool
+        print("Final save...")
+        journal.close()
+        if store:
+            store.close()
+        save_data_batch(all_data, base_filename, final=True)
+        atexit.unregister(emergency_save)
+        seen.close()
+        emergency_driver = None
+        if driver is not None:
+            pool.checkin(driver)
+            print("Browser returned to pool.")
+
+def scrape(query, options=None):
+    """Dashboard entry point: yields log lines and product batches as they happen."""
+    return progress.run(scrape_coop_products, query, options)
 
 if __name__ == "__main__":
+    # Emergency save on Ctrl+C or kill only applies to command-line runs
+    signal.signal(signal.SIGINT, emergency_save)
+    signal.signal(signal.SIGTERM, emergency_save)
+    atexit.register(emergency_save)
     print("Starting Co-op Flat Scraper")
     print("=" * 50)
     print("Ctrl+C anytime to save and quit safely.")
-    print("Data saves to CSV/Excel.")
+    print("Progress is checkpointed to an .ndjson journal; CSV/Excel are written at the end.")
     print("=" * 50)
     try:
         scrape_coop_products()
@@ -0,0 +1,83 @@
+import os
+import threading
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+# Query parameters that only track where a click came from and never change the product
+TRACKING_PARAMS = {
+    "gclid", "gclsrc", "dclid", "fbclid", "msclkid", "yclid", "mc_cid", "mc_eid",
+    "_ga", "_gl", "cmpid", "icid", "sc_cmp", "ref", "referrer", "source",
+}
+TRACKING_PREFIXES = ("utm_",)
+
+# Set DEDUP_PERSIST_DIR to remember seen products between runs (incremental crawls)
+PERSIST_DIR = os.environ.get("DEDUP_PERSIST_DIR", "")
+
+
+def _is_tracking(key):
+    key = key.lower()
+    return key in TRACKING_PARAMS or key.startswith(TRACKING_PREFIXES)
+
+
+def canonicalize_url(url):
+    """Lower-case scheme/host, drop the fragment and tracking parameters, sort what is left."""
+    if not url:
+        return url
+    parts = urlsplit(url.strip())
+    query = sorted((k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True) if not _is_tracking(k))
+    path = parts.path.rstrip("/") if len(parts.path) > 1 else parts.path
+    return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), path, urlencode(query), ""))
+
+
+def persist_path(name):
+    """Where the named index is stored, or None when persistence is switched off."""
+    if not PERSIST_DIR:
+        return None
+    os.makedirs(PERSIST_DIR, exist_ok=True)
+    return os.path.join(PERSIST_DIR, f"{name}_seen_urls.txt")
+
+
+class DedupIndex:
+    """
+    Set of canonical product URLs maintained on insert, so each check is O(1) however many
+    products have been collected. With a path, URLs are appended to a text file and loaded
+    back on the next run.
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+        self._seen = set()
+        self._lock = threading.Lock()
+        self._file = None
+        if path:
+            if os.path.exists(path):
+                with open(path, encoding="utf-8") as f:
+                    self._seen.update(line.rstrip("\n") for line in f if line.strip())
+                print(f"Loaded {len(self._seen)} previously seen URLs from {path}")
+            self._file = open(path, "a", encoding="utf-8", buffering=1)
+
+    def add(self, url):
+        """Record a URL. Returns True if it had not been seen before."""
+        key = canonicalize_url(url)
+        with self._lock:
+            if key in self._seen:
+                return False
+            self._seen.add(key)
+            if self._file:
+                self._file.write(key + "\n")
+        return True
+
+    def filter_new(self, records, key="URL"):
+        """Return the records whose URL is new, recording them as seen."""
+        return [r for r in records if self.add(r[key])]
+
+    def __contains__(self, url):
+        return canonicalize_url(url) in self._seen
+
+    def __len__(self):
+        return len(self._seen)
+
+    def close(self):
+        with self._lock:
+            if self._file:
+                self._file.close()
+                self._file = None
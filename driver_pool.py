@@ -0,0 +1,277 @@
+import os
+import time
+import atexit
+import threading
+from contextlib import contextmanager
+
+import metrics
+import netlog
+import progress
+import resource_policy
+
+# Pool sizing can be tuned per deployment without touching the scrapers
+DEFAULT_POOL_SIZE = int(os.environ.get("DRIVER_POOL_SIZE", 2))
+DEFAULT_MAX_USES = int(os.environ.get("DRIVER_MAX_USES", 20))
+# How long a scraper waits for a free session before giving up (seconds)
+CHECKOUT_TIMEOUT = float(os.environ.get("DRIVER_CHECKOUT_TIMEOUT", 300))
+# Browsers alive at once across every pool in the process, idle or in use (0 = no limit).
+# A pool that needs one more closes another retailer's idle browser rather than going over.
+MAX_BROWSERS = int(os.environ.get("MAX_BROWSERS", 8))
+
+_pools = {}
+_pools_lock = threading.Lock()
+# Long-running processes (app.py) launch sessions in the background before a search needs them.
+# Off by default: a one-off command-line run only ever needs the one browser it checks out.
+_prewarm = False
+_browsers = threading.Condition()
+_live_browsers = 0
+
+
+def _reserve_browser():
+    """Take one of the MAX_BROWSERS slots for a browser about to be launched. False if all are taken."""
+    global _live_browsers
+    with _browsers:
+        if MAX_BROWSERS and _live_browsers >= MAX_BROWSERS:
+            return False
+        _live_browsers += 1
+        return True
+
+
+def _release_browser():
+    global _live_browsers
+    with _browsers:
+        _live_browsers -= 1
+        _browsers.notify_all()
+
+
+def live_browsers():
+    with _browsers:
+        return _live_browsers
+
+
+def _evict_idle(keep):
+    """Quit the longest-idle browser of some other pool to free a slot. False if none is idle."""
+    with _pools_lock:
+        pools = [pool for pool in _pools.values() if pool is not keep]
+    for pool in pools:
+        with pool._cond:
+            driver = pool._idle.pop(0) if pool._idle else None
+        if driver is not None:
+            print(f"[{pool.name} pool] Closing an idle browser to stay within MAX_BROWSERS={MAX_BROWSERS}.")
+            pool._discard(driver)
+            return True
+    return False
+
+
+class DriverPool:
+    """Keeps up to `size` warm browser sessions for one retailer and hands them out one at a time."""
+
+    def __init__(self, name, factory, warmup=None, size=DEFAULT_POOL_SIZE, max_uses=DEFAULT_MAX_USES):
+        self.name = name
+        self.factory = factory      # Builds a new webdriver instance
+        self.warmup = warmup        # Loads the site and accepts cookies on a fresh driver
+        self.size = size
+        self.max_uses = max_uses
+        self._idle = []
+        self._in_use = {}
+        self._uses = {}
+        self._total = 0
+        self._closed = False
+        self._cond = threading.Condition()
+
+    def _launch(self):
+        start = time.time()
+        with metrics.phase("driver_launch", self.name):
+            driver = self.factory()
+            resource_policy.apply(driver, self.name)
+        if self.warmup:
+            try:
+                with metrics.phase("warm_up", self.name):
+                    self.warmup(driver)
+            except Exception as e:
+                print(f"[{self.name} pool] Warm-up failed, using cold session: {e}")
+        self._uses[id(driver)] = 0
+        print(f"[{self.name} pool] Launched browser in {time.time() - start:.1f}s")
+        return driver
+
+    def _is_healthy(self, driver):
+        try:
+            driver.execute_script("return document.readyState")
+            return bool(driver.window_handles)
+        except Exception:
+            return False
+
+    def _discard(self, driver):
+        try:
+            driver.quit()
+        except Exception:
+            pass
+        netlog.forget(driver)
+        with self._cond:
+            self._uses.pop(id(driver), None)
+            self._total -= 1
+            self._cond.notify()
+        _release_browser()
+
+    def _launch_failed(self):
+        with self._cond:
+            self._total -= 1
+            self._cond.notify()
+        _release_browser()
+
+    def prewarm(self, count=None):
+        """
+        Launch browsers until `count` (default: pool size) sessions are idle and ready.
+        Stops early when MAX_BROWSERS are already running.
+        """
+        count = self.size if count is None else min(count, self.size)
+        while True:
+            with self._cond:
+                if self._closed or len(self._idle) >= count or self._total >= self.size:
+                    return
+                if not _reserve_browser():
+                    return
+                self._total += 1
+            try:
+                driver = self._launch()
+            except Exception as e:
+                print(f"[{self.name} pool] Could not pre-launch browser: {e}")
+                self._launch_failed()
+                return
+            with self._cond:
+                self._idle.append(driver)
+                self._cond.notify()
+
+    def prewarm_async(self, count=None):
+        threading.Thread(target=self.prewarm, args=(count,), daemon=True).start()
+
+    def checkout(self, timeout=CHECKOUT_TIMEOUT):
+        """
+        Return a healthy driver, launching one if the pool (and MAX_BROWSERS) has room or waiting
+        for one to be returned. Raises TimeoutError after `timeout` seconds (None waits indefinitely)
+        and RuntimeError if the search is cancelled while it waits.
+        """
+        deadline = None if timeout is None else time.time() + timeout
+        while True:
+            driver = None
+            pool_has_room = False
+            with self._cond:
+                if self._closed:
+                    raise RuntimeError(f"{self.name} driver pool is closed")
+                if self._idle:
+                    driver = self._idle.pop()
+                elif self._total < self.size and _reserve_browser():
+                    self._total += 1
+                else:
+                    remaining = None if deadline is None else deadline - time.time()
+                    if remaining is not None and remaining <= 0:
+                        raise TimeoutError(f"No {self.name} browser became available within {timeout}s")
+                    if progress.cancelled():
+                        raise RuntimeError(f"Search cancelled while waiting for a {self.name} browser")
+                    # Wake up every second to notice a cancelled search
+                    pause = 1.0 if remaining is None else min(remaining, 1.0)
+                    if self._total >= self.size:
+                        self._cond.wait(pause)
+                        continue
+                    pool_has_room = True
+            if pool_has_room:
+                # Every browser in the process is taken: make room by closing another pool's idle one
+                if not _evict_idle(self):
+                    with _browsers:
+                        _browsers.wait(pause)
+                continue
+
+            if driver is None:
+                try:
+                    driver = self._launch()
+                except Exception:
+                    self._launch_failed()
+                    raise
+            elif not self._is_healthy(driver):
+                print(f"[{self.name} pool] Dropping dead browser session.")
+                self._discard(driver)
+                continue
+
+            with self._cond:
+                self._in_use[id(driver)] = driver
+            return driver
+
+    def checkin(self, driver, healthy=True):
+        """Give a driver back. Broken or worn-out sessions are quit instead of reused."""
+        with self._cond:
+            # Taken off the books straight away, so close() and checkin() never both quit it
+            if self._in_use.pop(id(driver), None) is None and self._closed:
+                return  # close() has already quit it and counted it out
+        if healthy:
+            netlog.poll(driver)
+        with self._cond:
+            uses = self._uses.get(id(driver), 0) + 1
+            self._uses[id(driver)] = uses
+            recycle = self._closed or not healthy or uses >= self.max_uses
+        if recycle or not self._is_healthy(driver):
+            if uses >= self.max_uses:
+                print(f"[{self.name} pool] Recycling browser after {uses} uses.")
+            self._discard(driver)
+            if _prewarm:
+                self.prewarm_async()  # Replace it before the next search needs it
+            return
+        with self._cond:
+            self._idle.append(driver)
+            self._cond.notify()
+
+    @contextmanager
+    def session(self, timeout=CHECKOUT_TIMEOUT):
+        """Check a driver out for the duration of a with-block."""
+        driver = self.checkout(timeout)
+        try:
+            yield driver
+        finally:
+            self.checkin(driver)
+
+    def close(self):
+        """Quit every session, including ones still checked out (e.g. on an emergency exit)."""
+        with self._cond:
+            self._closed = True
+            drivers = self._idle + list(self._in_use.values())
+            self._idle = []
+            self._in_use = {}
+        for driver in drivers:
+            self._discard(driver)
+
+
+def get_pool(name, factory, warmup=None, size=None, max_uses=None):
+    """Return the shared pool for a retailer, creating it on first use."""
+    with _pools_lock:
+        pool = _pools.get(name)
+        if pool is None:
+            pool = DriverPool(
+                name,
+                factory,
+                warmup,
+                size=DEFAULT_POOL_SIZE if size is None else size,
+                max_uses=DEFAULT_MAX_USES if max_uses is None else max_uses,
+            )
+            _pools[name] = pool
+            if _prewarm:
+                pool.prewarm_async()
+        return pool
+
+
+def enable_prewarm():
+    """Fill every pool in the background when it is created and after a session is recycled."""
+    global _prewarm
+    _prewarm = True
+    with _pools_lock:
+        pools = list(_pools.values())
+    for pool in pools:
+        pool.prewarm_async()
+
+
+def close_all():
+    with _pools_lock:
+        pools = list(_pools.values())
+    for pool in pools:
+        pool.close()
+
+
+atexit.register(close_all)
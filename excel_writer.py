@@ -0,0 +1,65 @@
+import atexit
+import threading
+import pandas as pd
+
+import metrics
+
+# Pending exports keyed by filename. A newer submit for the same file replaces the
+# queued one, so a burst of saves turns into a single openpyxl write.
+_pending = {}
+_cond = threading.Condition()
+_busy = False
+_worker = None
+
+
+def _write(filename, df, merge_key):
+    if merge_key and pd.io.common.file_exists(filename):
+        existing_df = pd.read_excel(filename)
+        df = pd.concat([existing_df, df]).drop_duplicates(subset=[merge_key])
+    df.to_excel(filename, index=False)
+    return len(df)
+
+
+def _run():
+    global _busy
+    while True:
+        with _cond:
+            while not _pending:
+                _cond.wait()
+            filename = next(iter(_pending))
+            df, merge_key, retailer = _pending.pop(filename)
+            _busy = True
+        try:
+            with metrics.phase("save_excel", retailer):
+                rows = _write(filename, df, merge_key)
+            print(f"Background Excel export finished: {filename} ({rows} rows)")
+        except Exception as e:
+            print(f"Background Excel export failed for {filename}: {e}")
+        finally:
+            with _cond:
+                _busy = False
+                _cond.notify_all()
+
+
+def submit(df, filename, merge_key=None):
+    """
+    Queue `df` to be written to `filename` on the background thread and return at once.
+    With `merge_key`, rows already in the file are kept and de-duplicated on that column.
+    """
+    global _worker
+    with _cond:
+        # Timed on the writer thread, so the submitting scraper's retailer travels with the job
+        _pending[filename] = (df.copy(), merge_key, metrics.current_retailer())
+        if _worker is None or not _worker.is_alive():
+            _worker = threading.Thread(target=_run, name="excel-writer", daemon=True)
+            _worker.start()
+        _cond.notify_all()
+
+
+def flush(timeout=None):
+    """Block until every queued export has been written. Returns False on timeout."""
+    with _cond:
+        return _cond.wait_for(lambda: not _pending and not _busy, timeout)
+
+
+atexit.register(flush)
@@ -0,0 +1,91 @@
+import json
+
+import metrics
+
+# Reads every product tile on the page in one execute_script call instead of
+# one WebDriver round trip per field. The field spec is embedded as JSON and the
+# tile selector is passed as arguments[0]. With spec.marker set, tiles already
+# read are skipped and complete ones are tagged, so each call only returns new tiles.
+_EXTRACT_JS = """
+var spec = %s;
+var tiles = document.querySelectorAll(arguments[0] || spec.tile);
+
+function read(el, attribute) {
+    var value;
+    if (attribute === "text") {
+        value = el.innerText;
+        if (value === undefined || value === null) value = el.textContent;
+    } else {
+        // Same lookup order as Selenium's get_attribute: property first, then attribute
+        value = el[attribute];
+        if (value === undefined || value === null || typeof value === "object") value = el.getAttribute(attribute);
+    }
+    return value === undefined || value === null ? "" : String(value).trim();
+}
+
+var rows = [];
+for (var t = 0; t < tiles.length; t++) {
+    var tile = tiles[t], row = {}, complete = true;
+    if (spec.marker && tile.hasAttribute(spec.marker)) continue;
+    for (var f = 0; f < spec.fields.length; f++) {
+        var field = spec.fields[f], value = null;
+        for (var s = 0; s < field.selectors.length && value === null; s++) {
+            var el = null;
+            try { el = field.selectors[s] ? tile.querySelector(field.selectors[s]) : tile; } catch (e) {}
+            if (el) {
+                var v = read(el, field.attribute);
+                if (v) value = v;
+            }
+        }
+        if (value === null) {
+            if (field.required) { complete = false; break; }
+            value = field.default;
+        }
+        row[field.name] = value;
+    }
+    if (complete) {
+        rows.push(row);
+        // Incomplete tiles (still rendering) stay unmarked and are retried next call
+        if (spec.marker) tile.setAttribute(spec.marker, "1");
+    }
+}
+return spec.marker ? {rows: rows, total: tiles.length} : rows;
+"""
+
+
+def field(selector, attribute="text", default="N/A"):
+    """
+    Describes one value to read from a product tile.
+    `selector` is a CSS selector relative to the tile (or a list of fallbacks tried in order,
+    "" meaning the tile itself). `attribute` is "text" or an attribute/property name.
+    A default of None marks the field as required: tiles without it are skipped.
+    """
+    selectors = [selector] if isinstance(selector, str) else list(selector)
+    return {"selectors": selectors, "attribute": attribute, "default": default, "required": default is None}
+
+
+def build_extraction_script(tile_selector, fields, marker=None):
+    """
+    Compile a {column: field(...)} spec into the JavaScript run by execute_script.
+    With a `marker` attribute name the script returns {rows, total} for unmarked tiles only.
+    """
+    spec = {
+        "tile": tile_selector,
+        "fields": [dict(options, name=name) for name, options in fields.items()],
+        "marker": marker,
+    }
+    return _EXTRACT_JS % json.dumps(spec)
+
+
+def compile_extractor(tile_selector, fields):
+    """
+    Returns extract(driver, selector=None) -> list of dicts, one per complete tile,
+    keyed by the column names in `fields`. `selector` overrides the tile selector.
+    """
+    script = build_extraction_script(tile_selector, fields)
+
+    def extract(driver, selector=None):
+        with metrics.phase("extract"):
+            return driver.execute_script(script, selector or tile_selector) or []
+
+    return extract
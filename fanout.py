@@ -0,0 +1,113 @@
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+
+import progress
+
+# Result pages scraped at once per retailer. Set PAGE_FANOUT_WORKERS=1 to go page by page.
+# Navigations still go through politeness.throttle, so this overlaps page rendering,
+# not the request rate each domain sees.
+FANOUT_WORKERS = int(os.environ.get("PAGE_FANOUT_WORKERS", 3))
+
+_LINKS_JS = """
+return Array.from(document.querySelectorAll(arguments[0])).map(function (a) {
+    return [a.textContent, a.href];
+});
+"""
+
+
+def worker_count(pool=None):
+    """Fan-out width, capped at the browser pool size so workers never wait on each other for a driver."""
+    workers = FANOUT_WORKERS
+    if pool is not None:
+        workers = min(workers, pool.size)
+    return max(1, workers)
+
+
+def fan_out(page_urls, scrape_url, workers=None):
+    """
+    Run scrape_url(url) for each result page on up to `workers` threads.
+    Yields (url, rows) in page order as soon as a page and every page before it is done,
+    so journals and stores still receive rows in order. rows is None for a failed page.
+    """
+    workers = worker_count() if workers is None else workers
+    sink = progress.current()
+
+    def run(url):
+        # Worker threads report to the same place as the scraper that started them
+        progress.attach(sink)
+        if progress.cancelled():
+            return None
+        try:
+            return scrape_url(url)
+        except Exception as e:
+            print(f"Error scraping {url}: {e}")
+            return None
+
+    if workers <= 1 or len(page_urls) <= 1:
+        for url in page_urls:
+            yield url, run(url)
+        return
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="page-fanout") as executor:
+        # map() hands results back in submission order
+        for url, rows in zip(page_urls, executor.map(run, page_urls)):
+            yield url, rows
+
+
+def fan_out_pages(page_urls, scrape_url, workers=None, first=2, max_pages=None):
+    """
+    fan_out over page_urls (pages first, first+1, ...), then over any further pages the last
+    page's pagination bar links to. Bars that only show a window of page numbers (1 2 3 ... 12)
+    can hide the real last page, which only shows up once the window moves.
+    Here scrape_url(url) returns (rows, links): the page's rows and its pagination (text, href)
+    pairs. Yields (page number, url, rows), rows being None for a failed page.
+    """
+    page = first
+    while page_urls:
+        last_links = None
+        for url, result in fan_out(page_urls, scrape_url, workers):
+            rows, last_links = result if result is not None else (None, None)
+            yield page, url, rows
+            page += 1
+        if max_pages is not None and page > max_pages:
+            return
+        page_urls = page_urls_from_links(last_links or [], first=page)
+        if page_urls and max_pages is not None:
+            page_urls = page_urls[:max_pages - page + 1]
+
+
+def _escape_braces(text):
+    return text.replace("{", "{{").replace("}", "}}")
+
+
+def page_url_template(href, page_number):
+    """Turn the link to page N into a format string for any page, e.g. '...?page={}'. None if not addressable."""
+    matches = list(re.finditer(r"(page\D{0,3})%d(?!\d)" % page_number, href, re.IGNORECASE))
+    if not matches:
+        return None
+    match = matches[-1]
+    return _escape_braces(href[:match.start()] + match.group(1)) + "{}" + _escape_braces(href[match.end():])
+
+
+def page_urls_from_links(links, first=2):
+    """
+    Given (text, href) pairs from a pagination bar, build the URLs of pages first..last.
+    Returns None if the pages can't be addressed by URL, so callers fall back to clicking Next.
+    """
+    numbered = {}
+    for text, href in links:
+        text = (text or "").strip()
+        if text.isdigit() and href:
+            numbered.setdefault(int(text), href)
+    if first not in numbered:
+        return None
+    template = page_url_template(numbered[first], first)
+    if template is None:
+        return None
+    return [template.format(n) for n in range(first, max(numbered) + 1)]
+
+
+def pagination_links(driver, selector):
+    """(text, href) for every link matching `selector`, in one round trip."""
+    return [tuple(link) for link in driver.execute_script(_LINKS_JS, selector) or []]
@@ -0,0 +1,134 @@
+import os
+import json
+import urllib3
+from urllib.parse import urljoin
+
+import metrics
+import recorder
+
+# Optional dependency: without BeautifulSoup the fast path is skipped and every page uses Selenium
+try:
+    from bs4 import BeautifulSoup
+except ImportError:
+    BeautifulSoup = None
+
+# Set HTTP_FAST_PATH=0 to always go straight to the browser
+FAST_PATH_ENABLED = os.environ.get("HTTP_FAST_PATH", "1") != "0"
+HTTP_TIMEOUT = float(os.environ.get("HTTP_FAST_PATH_TIMEOUT", 10))
+
+HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) "
+                  "Chrome/137.0.0.0 Safari/537.36",
+    "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
+    "Accept-Language": "en-GB,en;q=0.9",
+    "Accept-Encoding": "gzip, deflate",
+}
+
+# One keep-alive connection pool per host, shared by every scraper in the process
+_http = urllib3.PoolManager(num_pools=20, maxsize=4, headers=HEADERS, retries=urllib3.Retry(2, redirect=5))
+
+
+def enabled():
+    return FAST_PATH_ENABLED and BeautifulSoup is not None
+
+
+def _text(el):
+    return " ".join(el.get_text(" ").split())
+
+
+class FetchedPage:
+    """A page fetched over plain HTTP, read with the same field specs as the browser extractor."""
+
+    def __init__(self, url, status, html):
+        self.url = url
+        self.status = status
+        self.html = html
+        self.soup = BeautifulSoup(html, "html.parser")
+
+    def _read(self, el, attribute):
+        if attribute == "text":
+            return _text(el)
+        value = el.get(attribute)
+        if isinstance(value, list):
+            value = " ".join(value)
+        value = (value or "").strip()
+        # The browser returns href/src as absolute URLs, so match that here
+        if value and attribute in ("href", "src"):
+            value = urljoin(self.url, value)
+        return value
+
+    @metrics.timed("extract")
+    def products(self, tile_selector, fields):
+        """Apply an extraction spec (see extraction.field) to the static HTML."""
+        rows = []
+        for tile in self.soup.select(tile_selector):
+            row = {}
+            for name, spec in fields.items():
+                value = None
+                for selector in spec["selectors"]:
+                    el = tile.select_one(selector) if selector else tile
+                    if el is not None:
+                        value = self._read(el, spec["attribute"]) or None
+                    if value:
+                        break
+                if value is None:
+                    if spec["required"]:
+                        row = None
+                        break
+                    value = spec["default"]
+                row[name] = value
+            if row is not None:
+                rows.append(row)
+        return rows
+
+    def text(self, selector, default=None):
+        el = self.soup.select_one(selector)
+        return _text(el) if el is not None else default
+
+    def attr(self, selector, attribute, default=None):
+        el = self.soup.select_one(selector)
+        return (self._read(el, attribute) or default) if el is not None else default
+
+    def links(self, selector):
+        """(text, absolute href) for every element matching `selector`, like fanout.pagination_links."""
+        return [(_text(el), self._read(el, "href")) for el in self.soup.select(selector)]
+
+    def json_blob(self, selector="script#__NEXT_DATA__"):
+        """Parse a JSON payload embedded in a <script> tag, if the page has one."""
+        el = self.soup.select_one(selector)
+        if el is None or not el.string:
+            return None
+        try:
+            return json.loads(el.string)
+        except ValueError:
+            return None
+
+
+@metrics.timed("http_fetch")
+def fetch_page(url):
+    """GET a page over the pooled HTTP client. Returns None if it could not be fetched as HTML."""
+    if not enabled():
+        return None
+    if recorder.replaying():
+        return _replayed_page(url)
+    try:
+        response = _http.request("GET", url, timeout=HTTP_TIMEOUT)
+    except Exception as e:
+        print(f"HTTP fetch failed for {url}: {e}")
+        return None
+    recorder.record("GET", url, response.status, dict(response.headers), response.data,
+                    response.headers.get("Content-Type"), response.geturl())
+    if response.status != 200:
+        print(f"HTTP fetch got status {response.status} for {url}, falling back to browser.")
+        return None
+    if "html" not in response.headers.get("Content-Type", "text/html"):
+        return None
+    final_url = response.geturl() or url
+    return FetchedPage(urljoin(url, final_url), response.status, response.data.decode("utf-8", errors="replace"))
+
+
+def _replayed_page(url):
+    entry = recorder.lookup("GET", url)
+    if entry is None or entry["status"] != 200 or "html" not in (entry.get("mime") or "text/html"):
+        return None
+    return FetchedPage(urljoin(url, entry["final_url"]), 200, entry["body"].decode("utf-8", errors="replace"))
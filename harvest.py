@@ -0,0 +1,126 @@
+from extraction import build_extraction_script
+from waits import wait_for_dom_quiet, wait_for_count_growth
+from politeness import throttle
+import progress
+import metrics
+import netlog
+import api_capture
+
+# Attribute stamped on tiles once they have been read
+HARVEST_MARKER = "data-harvested"
+
+# A scroll that leaves pageYOffset where it was (a layout that scrolls an inner container, or
+# a footer that never comes into view) counts as being at the bottom, or run() would never end
+_SCROLL_JS = """
+var before = window.pageYOffset;
+window.scrollBy(0, window.innerHeight * arguments[0]);
+var root = document.scrollingElement || document.documentElement;
+return window.pageYOffset === before || window.innerHeight + window.pageYOffset >= root.scrollHeight - 2;
+"""
+
+# Tags the tiles whose product link is one of the given URLs as read, without reading them, for
+# products that came from the API. Links are compared without their query string or fragment.
+_MARK_JS = """
+var tiles = document.querySelectorAll(arguments[0]), marker = arguments[1];
+var selectors = arguments[2], attribute = arguments[3], urls = {};
+function key(url) {
+    try { var u = new URL(url, location.href); return u.origin + u.pathname.replace(/\\/+$/, ""); }
+    catch (e) { return url; }
+}
+for (var i = 0; i < arguments[4].length; i++) urls[key(arguments[4][i])] = true;
+var marked = 0;
+for (var t = 0; t < tiles.length; t++) {
+    if (tiles[t].hasAttribute(marker)) continue;
+    for (var s = 0; s < selectors.length; s++) {
+        var el = selectors[s] ? tiles[t].querySelector(selectors[s]) : tiles[t];
+        var link = el && (el[attribute] || el.getAttribute(attribute));
+        if (link) {
+            if (urls[key(link)]) { tiles[t].setAttribute(marker, "1"); marked++; }
+            break;
+        }
+    }
+}
+return marked;
+"""
+
+
+class TileHarvester:
+    """
+    Reads an infinite-scroll results list incrementally. Each tile is read once and then
+    tagged in the page, so a scroll costs the same whether 50 or 5,000 products are loaded.
+
+        harvester = TileHarvester(driver, PRODUCT_TILE, PRODUCT_FIELDS, HOME_URL)
+        harvester.run(on_batch)
+    """
+
+    def __init__(self, driver, tile_selector, fields, throttle_url, marker=HARVEST_MARKER):
+        self.driver = driver
+        self.tile_selector = tile_selector
+        self.throttle_url = throttle_url
+        self.marker = marker
+        self.script = build_extraction_script(tile_selector, fields, marker)
+        self.url_field = fields.get("URL")
+        self.total = 0  # Tiles in the page at the last collect()
+        self.scrolls = 0
+
+    def collect(self):
+        """
+        Return the tiles added (or finished rendering) since the last call. Products captured from
+        the retailer's API come first; tiles they cover are tagged as read, and the rest (e.g. a
+        server-rendered first batch) are read from the DOM. Overlap is left to the scraper's DedupIndex.
+        """
+        rows = api_capture.take(self.driver)  # Only while a scraper is watching its product API
+        if rows and self.url_field:
+            urls = [row["URL"] for row in rows if row.get("URL")]
+            self.driver.execute_script(_MARK_JS, self.tile_selector, self.marker,
+                                       self.url_field["selectors"], self.url_field["attribute"], urls)
+        with metrics.phase("extract"):
+            result = self.driver.execute_script(self.script, self.tile_selector) or {}
+        self.total = result.get("total", self.total)
+        netlog.poll(self.driver)  # Product XHRs from the last scroll, while Chrome still holds them
+        return rows + result.get("rows", [])
+
+    def scroll(self, fraction=1.0):
+        """Scroll down by `fraction` of a viewport. Returns True once the bottom of the page is reached or it stops moving."""
+        self.scrolls += 1
+        throttle(self.throttle_url)  # Each scroll can trigger a product fetch
+        return bool(self.driver.execute_script(_SCROLL_JS, fraction))
+
+    def run(self, on_batch, load_more=None, fraction=1.0, wait=4, idle_rounds=2):
+        """
+        Scroll until the list stops growing, calling on_batch(rows) with each set of new tiles.
+        The list has ended when the page is scrolled to the bottom, no tiles arrive within `wait`
+        seconds `idle_rounds` times in a row, and load_more() (e.g. a "Show more" click) returns False.
+        """
+        idle = 0
+        while True:
+            rows = self.collect()
+            if rows:
+                progress.page_loaded(self.scrolls)
+                on_batch(rows)
+                idle = 0
+            if progress.cancelled():
+                print("Stopping early: the search was cancelled.")
+                return self.total
+
+            at_bottom = self.scroll(fraction)
+            before = self.total
+            if wait_for_count_growth(self.driver, self.tile_selector, before, timeout=wait if at_bottom else 0.5) > before:
+                wait_for_dom_quiet(self.driver, quiet=0.3, timeout=2)
+                idle = 0
+                continue
+            if not at_bottom:
+                # Tiles already in the list may still be filling in as they scroll into view
+                wait_for_dom_quiet(self.driver, quiet=0.3, timeout=2)
+                continue
+            if load_more is not None and load_more():
+                idle = 0
+                continue
+
+            idle += 1
+            if idle >= idle_rounds:
+                rows = self.collect()
+                if rows:
+                    progress.page_loaded(self.scrolls)
+                    on_batch(rows)
+                return self.total
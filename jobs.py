@@ -0,0 +1,282 @@
+import os
+import time
+import uuid
+import threading
+from collections import OrderedDict, Counter, deque
+
+from queries import normalize_query
+
+# Finished jobs stay queryable until this many newer ones have finished
+MAX_FINISHED_JOBS = int(os.environ.get("MAX_FINISHED_JOBS", 200))
+# Dashboard jobs are cancelled once nobody has been watching them for this many seconds
+ABANDON_GRACE = float(os.environ.get("JOB_ABANDON_GRACE", 30))
+
+
+class ScrapeJob:
+    """
+    One search running across the scrapers. Its output is an append-only log of JSON-ready
+    event dicts (see progress.py, plus a "retailer" key), so any number of clients can follow
+    the same job, each starting from the first event.
+    """
+
+    def __init__(self, query, user=None, cancel_when_abandoned=False):
+        self.id = uuid.uuid4().hex[:12]
+        self.query = query
+        self.user = user
+        self.created = time.time()
+        self.finished_at = None
+        self.events = []
+        self.retailers = {}  # retailer -> queued / running / completed / failed / cached / cancelled
+        self.products = {}  # retailer -> new products scraped so far
+        self.progress = {}  # retailer -> counters from its latest event (elapsed, pages, items, rates)
+        self.done = False
+        self.cancelled = threading.Event()
+        self.cancel_when_abandoned = cancel_when_abandoned
+        self.key = None  # What identical searches are grouped by in _active (see start_or_attach)
+        self.subscribers = 0
+        self._cancel_hooks = []
+        self._cond = threading.Condition()
+
+    @property
+    def status(self):
+        if self.done:
+            return "cancelled" if self.cancelled.is_set() else "finished"
+        if self.cancelled.is_set():
+            return "cancelling"
+        if any(state != "queued" for state in self.retailers.values()):
+            return "running"
+        return "queued"
+
+    def set_retailer(self, retailer, state):
+        self.retailers[retailer] = state
+
+    def add_products(self, retailer, count):
+        with self._cond:
+            self.products[retailer] = self.products.get(retailer, 0) + count
+
+    def update_progress(self, retailer, event):
+        counters = {key: event[key] for key in ("elapsed", "pages", "items", "pages_per_sec", "items_per_sec") if key in event}
+        if counters:
+            self.progress[retailer] = counters
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "query": self.query,
+            "status": self.status,
+            "retailers": dict(self.retailers),
+            "products": dict(self.products),
+            "progress": dict(self.progress),
+            "events": len(self.events),
+            "created": self.created,
+            "finished": self.finished_at,
+        }
+
+    def emit(self, event):
+        with self._cond:
+            self.events.append(event)
+            self._cond.notify_all()
+
+    def log(self, line, retailer=None):
+        self.emit({"type": "log", "retailer": retailer, "line": line})
+
+    def finish(self):
+        with self._cond:
+            self.done = True
+            self.finished_at = time.time()
+            self._cond.notify_all()
+
+    def follow(self, start=0, idle=None):
+        """
+        Yield every event from index `start` on, blocking for new ones until the job finishes.
+        With `idle` set, None is yielded after that many quiet seconds so the caller can
+        write a keep-alive and find out whether its client is still there.
+        """
+        position = start
+        while True:
+            with self._cond:
+                if position >= len(self.events) and not self.done:
+                    self._cond.wait(idle)
+                batch = self.events[position:]
+                finished = self.done
+            if not batch and not finished:
+                if idle is not None:
+                    yield None
+                continue
+            for event in batch:
+                yield event
+            position += len(batch)
+            if finished and position >= len(self.events):
+                return
+
+    def add_cancel_hook(self, hook):
+        """Call hook() when the job is cancelled (straight away if it already has been)."""
+        with self._cond:
+            if not self.cancelled.is_set():
+                self._cancel_hooks.append(hook)
+                return
+        hook()
+
+    def remove_cancel_hook(self, hook):
+        with self._cond:
+            if hook in self._cancel_hooks:
+                self._cancel_hooks.remove(hook)
+
+    def cancel(self, reason="cancelled"):
+        with self._cond:
+            if self.cancelled.is_set() or self.done:
+                return False
+            self.cancelled.set()
+            hooks, self._cancel_hooks = self._cancel_hooks, []
+        self.log(f"🛑 Search {reason}, stopping scrapers...")
+        for hook in hooks:
+            try:
+                hook()
+            except Exception as e:
+                print(f"Cancel hook failed: {e}")
+        return True
+
+
+class TaskScheduler:
+    """
+    Runs scraper tasks on a fixed set of worker threads, one scraper each. A scraper's browsers
+    (pooled, fan-out) are capped separately, by driver_pool.MAX_BROWSERS.
+    Users are served round-robin so one person's burst of searches can't starve everyone else,
+    and no retailer ever has more than `per_retailer` scrapers running at once.
+    """
+
+    def __init__(self, workers, per_retailer=1):
+        self.workers = workers
+        self.per_retailer = per_retailer
+        self._queues = OrderedDict()  # user -> deque of (retailer, fn), in round-robin order
+        self._running = Counter()
+        self._cond = threading.Condition()
+        for i in range(workers):
+            threading.Thread(target=self._work, name=f"scrape-worker-{i}", daemon=True).start()
+
+    def submit(self, user, retailer, fn):
+        with self._cond:
+            self._queues.setdefault(user, deque()).append((retailer, fn))
+            self._cond.notify()
+
+    def queued(self):
+        with self._cond:
+            return sum(len(tasks) for tasks in self._queues.values())
+
+    def running(self):
+        with self._cond:
+            return dict(+self._running)
+
+    def _next_task(self):
+        for user, tasks in self._queues.items():
+            for task in tasks:
+                if self._running[task[0]] < self.per_retailer:
+                    tasks.remove(task)
+                    # This user goes to the back of the line
+                    del self._queues[user]
+                    if tasks:
+                        self._queues[user] = tasks
+                    return task
+        return None
+
+    def _work(self):
+        while True:
+            with self._cond:
+                task = self._next_task()
+                while task is None:
+                    self._cond.wait()
+                    task = self._next_task()
+                retailer, fn = task
+                self._running[retailer] += 1
+            try:
+                fn()
+            except Exception as e:
+                print(f"Scrape task for {retailer} failed: {e}")
+            finally:
+                with self._cond:
+                    self._running[retailer] -= 1
+                    self._cond.notify_all()
+
+
+# Jobs still running, by normalized query. Identical searches attach here instead of starting over.
+_active = {}
+_active_lock = threading.Lock()
+# Every job by id, running or recently finished, for the status endpoints
+_jobs = OrderedDict()
+
+
+def get_job(job_id):
+    with _active_lock:
+        return _jobs.get(job_id)
+
+
+def list_jobs():
+    with _active_lock:
+        return list(_jobs.values())
+
+
+def _forget_old_jobs():
+    finished = [job_id for job_id, job in _jobs.items() if job.done]
+    for job_id in finished[:max(0, len(finished) - MAX_FINISHED_JOBS)]:
+        del _jobs[job_id]
+
+
+def cancel(job, reason="cancelled"):
+    """Cancel a job. New searches for the same term start a fresh job instead of joining this one."""
+    with _active_lock:
+        if _active.get(job.key) is job:
+            del _active[job.key]
+    return job.cancel(reason)
+
+
+def subscribe(job):
+    with _active_lock:
+        job.subscribers += 1
+
+
+def unsubscribe(job):
+    """A viewer left. Jobs that should die with their viewers are cancelled after a grace period."""
+    with _active_lock:
+        job.subscribers -= 1
+        abandoned = job.subscribers <= 0 and job.cancel_when_abandoned and not job.done
+    if abandoned:
+        def check():
+            if job.subscribers <= 0 and not job.done:
+                cancel(job, "abandoned by its viewers")
+        timer = threading.Timer(ABANDON_GRACE, check)
+        timer.daemon = True
+        timer.start()
+
+
+def start_or_attach(query, run, user=None, cancel_when_abandoned=False, fresh=False):
+    """
+    Return (job, created). If a job for the same query is already running it is returned as-is;
+    otherwise a new job is started on a background thread with run(job). Searches that skip
+    cached results (`fresh`) are only grouped with each other, never with a job replaying the cache.
+    """
+    key = (normalize_query(query), fresh)
+    with _active_lock:
+        job = _active.get(key)
+        if job is not None:
+            # Someone who wants the job to outlive its viewers (e.g. the API) keeps it alive
+            job.cancel_when_abandoned = job.cancel_when_abandoned and cancel_when_abandoned
+            return job, False
+        job = ScrapeJob(query, user, cancel_when_abandoned)
+        job.key = key
+        _active[key] = job
+        _jobs[job.id] = job
+        _forget_old_jobs()
+
+    def target():
+        try:
+            run(job)
+        except Exception as e:
+            job.log(f"❌ Job error: {e}")
+        finally:
+            with _active_lock:
+                if _active.get(key) is job:
+                    del _active[key]
+            job.finish()
+
+    threading.Thread(target=target, daemon=True).start()
+    return job, True
@@ -0,0 +1,113 @@
+import os
+import sys
+import json
+import time
+import threading
+import pandas as pd
+
+# fsync after this many rows or this many seconds, whichever comes first
+FSYNC_EVERY = int(os.environ.get("JOURNAL_FSYNC_EVERY", 100))
+FSYNC_INTERVAL = float(os.environ.get("JOURNAL_FSYNC_INTERVAL", 5.0))
+
+
+def journal_path(base_filename):
+    """
+    <base>_<HHMMSS>-<pid>.ndjson. Output names only carry the date, so without the per-run part
+    a same-day rerun or a cache refresh would overwrite the previous run's checkpoint.
+    """
+    return f"{base_filename}_{time.strftime('%H%M%S')}-{os.getpid()}.ndjson"
+
+
+class CheckpointJournal:
+    """
+    Append-only NDJSON checkpoint for one scraper run. Each batch only writes its new rows,
+    so checkpoint cost stays flat however long the run gets. CSV/XLSX are built from it once,
+    at the end of the run or on demand with `python journal.py <file.ndjson>`.
+    """
+
+    def __init__(self, base_filename, fsync_every=FSYNC_EVERY, fsync_interval=FSYNC_INTERVAL):
+        self.path = journal_path(base_filename)
+        self.fsync_every = fsync_every
+        self.fsync_interval = fsync_interval
+        self.rows_written = 0
+        self._pending = 0
+        self._last_sync = time.monotonic()
+        self._lock = threading.Lock()
+        self._file = open(self.path, "a", encoding="utf-8")  # Never truncate an earlier checkpoint
+
+    def append(self, rows):
+        if not rows:
+            return 0
+        lines = "".join(json.dumps(row, ensure_ascii=False, default=str) + "\n" for row in rows)
+        with self._lock:
+            if self._file is None:
+                return 0
+            self._file.write(lines)
+            self._file.flush()
+            self.rows_written += len(rows)
+            self._pending += len(rows)
+            if self._pending >= self.fsync_every or time.monotonic() - self._last_sync >= self.fsync_interval:
+                self._sync()
+        return len(rows)
+
+    def _sync(self):
+        os.fsync(self._file.fileno())
+        self._pending = 0
+        self._last_sync = time.monotonic()
+
+    def sync(self):
+        with self._lock:
+            if self._file is not None and self._pending:
+                self._sync()
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.flush()
+                self._sync()
+                self._file.close()
+                self._file = None
+
+
+def read_journal(path):
+    """Load every complete row from a journal. A torn last line from a crash is skipped."""
+    rows = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                rows.append(json.loads(line))
+            except ValueError:
+                print(f"Skipping incomplete journal line in {path}")
+    return rows
+
+
+def materialize(path, base_filename=None):
+    """Write the journal's rows to <base>.csv and <base>.xlsx in one go."""
+    rows = read_journal(path)
+    if not rows:
+        print(f"No rows in {path}.")
+        return False
+    if base_filename is None:
+        base_filename = path[:-len(".ndjson")] if path.endswith(".ndjson") else path
+    df = pd.DataFrame(rows).drop_duplicates(subset=["URL"], keep="first")
+
+    try:
+        df.to_csv(f"{base_filename}.csv", index=False, encoding="utf-8-sig")
+        print(f"Saved {len(df)} rows to CSV: {base_filename}.csv")
+    except Exception as e:
+        print(f"CSV save failed: {e}")
+
+    try:
+        df.to_excel(f"{base_filename}.xlsx", index=False)
+        print(f"Saved {len(df)} rows to Excel: {base_filename}.xlsx")
+    except Exception as e:
+        print(f"Excel save failed: {e}")
+    return True
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("Usage: python journal.py <run.ndjson> [more.ndjson ...]")
+        sys.exit(1)
+    for journal_file in sys.argv[1:]:
+        materialize(journal_file)
@@ -0,0 +1,154 @@
+import time
+import threading
+from functools import wraps
+from contextlib import contextmanager
+
+import progress
+
+# Timers and counters for the scrapers' hot paths, rendered in the Prometheus text format
+# by render() (served on /metrics by app.py). Kept in-process and dependency-free: the
+# numbers only cover scrapers run by this server, and reset when it restarts.
+
+PHASE_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+RATE_BUCKETS = (0.1, 0.25, 0.5, 1, 2, 5, 10, 25, 50, 100, 250)
+RUN_BUCKETS = (5, 10, 30, 60, 120, 300, 600, 1200, 1800, 3600)
+
+_registry = []
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+def _number(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels[name] for name in self.labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_labels(self.labels, key)} {_number(value)}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, help, labels=(), buckets=PHASE_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets) + (float("inf"),)
+        self._series = {}  # label values -> [bucket counts, sum, count]
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def observe(self, value, **labels):
+        key = tuple(labels[name] for name in self.labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][i] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, (counts, total, count) in sorted(self._series.items()):
+                for bound, bucket_count in zip(self.buckets, counts):
+                    lines.append(f"{self.name}_bucket{_labels(self.labels, key, [('le', _number(bound))])} {bucket_count}")
+                lines.append(f"{self.name}_sum{_labels(self.labels, key)} {_number(total)}")
+                lines.append(f"{self.name}_count{_labels(self.labels, key)} {count}")
+        return lines
+
+
+PHASE_SECONDS = Histogram(
+    "scraper_phase_seconds",
+    "Time spent per scrape phase (driver_launch, warm_up, cookie_consent, throttle, page_load, http_fetch, wait, extract, save, save_excel).",
+    ("retailer", "phase"),
+)
+PAGES = Counter("scraper_pages_total", "Result pages (or scroll batches) read.", ("retailer",))
+ITEMS = Counter("scraper_items_total", "New products scraped.", ("retailer",))
+RUNS = Counter("scraper_runs_total", "Finished scraper runs by outcome (ok, failed, cancelled).", ("retailer", "outcome"))
+RUN_SECONDS = Histogram("scraper_run_seconds", "Wall time of a scraper run.", ("retailer",), RUN_BUCKETS)
+RUN_PAGES_PER_SEC = Histogram("scraper_run_pages_per_second", "Pages per second over a whole run.", ("retailer",), RATE_BUCKETS)
+RUN_ITEMS_PER_SEC = Histogram("scraper_run_items_per_second", "Products per second over a whole run.", ("retailer",), RATE_BUCKETS)
+
+
+def current_retailer():
+    """The retailer of the in-process run on this thread, or "unknown" (e.g. on the command line)."""
+    sink = progress.current()
+    return getattr(sink, "retailer", None) or "unknown"
+
+
+def observe_phase(name, seconds, retailer=None):
+    PHASE_SECONDS.observe(seconds, retailer=retailer or current_retailer(), phase=name)
+
+
+@contextmanager
+def phase(name, retailer=None):
+    """Time the with-block as one `name` phase. The retailer defaults to the current run's."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe_phase(name, time.perf_counter() - start, retailer)
+
+
+def timed(name):
+    """Decorator form of phase()."""
+    def decorate(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            with phase(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def record_event(retailer, event):
+    """Update the per-retailer counters from a progress event (see progress.py)."""
+    if event["type"] == "page_loaded":
+        PAGES.inc(retailer=retailer)
+    elif event["type"] == "products_batch":
+        ITEMS.inc(event["count"], retailer=retailer)
+    elif event["type"] == "finished":
+        outcome = "cancelled" if event.get("cancelled") else "ok" if event.get("ok") else "failed"
+        RUNS.inc(retailer=retailer, outcome=outcome)
+        if "elapsed" in event:
+            RUN_SECONDS.observe(event["elapsed"], retailer=retailer)
+            RUN_PAGES_PER_SEC.observe(event["pages_per_sec"], retailer=retailer)
+            RUN_ITEMS_PER_SEC.observe(event["items_per_sec"], retailer=retailer)
+
+
+def render():
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
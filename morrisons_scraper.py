@@ -1,4 +1,4 @@
-import time
+import os
 import pandas as pd
 from selenium import webdriver
 from selenium.webdriver.common.by import By
@@ -11,6 +11,29 @@ import signal
 import sys
 import atexit
 from urllib.parse import quote_plus
+import driver_pool
+from extraction import field
+from harvest import TileHarvester
+from waits import wait_for_dom_quiet
+from politeness import polite_get
+from dedup import DedupIndex, persist_path
+from journal import CheckpointJournal
+import excel_writer
+import parquet_store
+import progress
+import recorder
+import metrics
+
+BASE_URL = os.environ.get("MORRISONS_BASE_URL", "https://groceries.morrisons.com").rstrip("/")
+HOME_URL = f"{BASE_URL}/"
+
+PRODUCT_TILE = "div.product-card-container"
+PRODUCT_FIELDS = {
+    "Name": field("h3[data-test='fop-title']", default=None),
+    "Price": field("span[data-test='fop-price']", default=None),
+    "Unit Price": field("span[data-test='fop-price-per-unit']", default=None),
+    "URL": field("a[data-test='fop-product-link']", "href", default=None),
+}
 
 # Globals for emergency save
 emergency_data = []
@@ -18,6 +41,7 @@ emergency_filename_base = ""
 emergency_driver = None
 
 
+@metrics.timed("save")
 def save_data_batch(data_to_save, base_filename, final=False):
     if not data_to_save:
         print("No data to save.")
@@ -30,13 +54,14 @@ def save_data_batch(data_to_save, base_filename, final=False):
     try:
         df.to_csv(csv_file, index=False, encoding="utf-8-sig")
         print(f" Saved CSV: {csv_file}")
+        progress.saved(csv_file, len(df))
     except Exception as e:
         print(f"CSV save failed: {e}")
 
     try:
         import openpyxl
-        df.to_excel(excel_file, index=False)
-        print(f" Saved Excel: {excel_file}")
+        excel_writer.submit(df, excel_file)  # Written on the background thread
+        print(f" Queued Excel export: {excel_file}")
     except Exception as e:
         print(f" Excel save failed: {e}")
     return True
@@ -53,20 +78,11 @@ def emergency_save(signum=None, frame=None):
             emergency_driver.quit()
         except:
             pass
+    excel_writer.flush()
     sys.exit(0)
 
 
-def scrape_morrisons_products():
-    query = input("Search for Morrisons product: ").strip() or "milk"
-    encoded_query = quote_plus(query)
-    base_filename = f"morrisons_{query.replace(' ', '_')}_{datetime.now().strftime('%Y%m%d')}"
-
-    global emergency_data, emergency_filename_base, emergency_driver
-    emergency_filename_base = base_filename
-    signal.signal(signal.SIGINT, emergency_save)
-    signal.signal(signal.SIGTERM, emergency_save)
-    atexit.register(emergency_save)
-
+def create_driver():
     options = Options()
     options.add_argument("--headless=new")
     options.add_argument("--window-size=1920,1080")
@@ -76,98 +92,129 @@ def scrape_morrisons_products():
     options.add_argument("--disable-gpu")
     options.add_argument("--log-level=3")
     options.add_argument("--start-maximized")
+    recorder.configure(options)
+    return webdriver.Chrome(options=options)
 
-    driver = webdriver.Chrome(options=options)
-    emergency_driver = driver
-    wait = WebDriverWait(driver, 15)
-
-    url = f"https://groceries.morrisons.com/search?q={encoded_query}"
-    print(f"Searching Morrisons for: {query}")
-    print(f"Opening URL: {url}")
-    driver.get(url)
 
+@metrics.timed("cookie_consent")
+def accept_cookies(driver):
     try:
-        cookie_btn = wait.until(EC.element_to_be_clickable((By.ID, "onetrust-accept-btn-handler")))
+        cookie_btn = WebDriverWait(driver, 15).until(EC.element_to_be_clickable((By.ID, "onetrust-accept-btn-handler")))
         cookie_btn.click()
         print("Accepted cookies.")
-        time.sleep(6)
+        wait_for_dom_quiet(driver, timeout=6)
     except:
         print("Cookie button not found or already accepted.")
 
+
+def warm_up(driver):
+    """Open the home page and accept cookies so pooled sessions start ready to search."""
+    polite_get(driver, HOME_URL)
+    accept_cookies(driver)
+
+
+def get_driver_pool():
+    return driver_pool.get_pool("Morrisons", create_driver, warm_up)
+
+
+def scrape_morrisons_products(query=None):
+    if query is None:
+        query = input("Search for Morrisons product: ")
+    query = query.strip() or "milk"
+    encoded_query = quote_plus(query)
+    base_filename = f"morrisons_{query.replace(' ', '_')}_{datetime.now().strftime('%Y%m%d')}"
+
+    global emergency_data, emergency_filename_base, emergency_driver
+    emergency_filename_base = base_filename
+
     all_data = []
-    seen_urls = set()
-    scroll_count = 0
-    total_scraped = 0
-    wait_time = 8
-
-    def scroll_and_scrape():
-        nonlocal scroll_count, wait_time, total_scraped
-        scroll_count += 1
-        print(f"Scroll #{scroll_count}")
-        driver.execute_script("window.scrollBy(0, window.innerHeight);")
-        time.sleep(wait_time)
+    emergency_data = all_data  # Shared reference, nothing to copy per scroll
+    seen = DedupIndex(persist_path("morrisons"))
+    journal = CheckpointJournal(base_filename)
+    store = parquet_store.open_writer("morrisons", query)  # None unless PARQUET_STORE_DIR is set
+
+    pool = get_driver_pool()
+    driver = None
+    try:
+        driver = pool.checkout()  # Already warmed up with cookies accepted
+        emergency_driver = driver
+        wait = WebDriverWait(driver, 15)
+
+        url = f"{BASE_URL}/search?q={encoded_query}"
+        print(f"Searching Morrisons for: {query}")
+        print(f"Opening URL: {url}")
+        polite_get(driver, url)
 
         try:
-            wait.until(EC.presence_of_all_elements_located((By.CSS_SELECTOR, "div.product-card-container")))
+            with metrics.phase("wait"):
+                wait.until(EC.presence_of_all_elements_located((By.CSS_SELECTOR, PRODUCT_TILE)))
         except TimeoutException:
             print("Timeout waiting for products, stopping.")
-            return False
 
-        product_elements = driver.find_elements(By.CSS_SELECTOR, "div.product-card-container")
-        page_data = []
+        # Each scroll only reads the tiles added since the previous one
+        harvester = TileHarvester(driver, PRODUCT_TILE, PRODUCT_FIELDS, HOME_URL)
 
-        for item in product_elements:
-            try:
-                name = item.find_element(By.CSS_SELECTOR, "h3[data-test='fop-title']").text.strip()
-                price = item.find_element(By.CSS_SELECTOR, "span[data-test='fop-price']").text.strip()
-                unit_price = item.find_element(By.CSS_SELECTOR, "span[data-test='fop-price-per-unit']").text.strip()
-                rel_link = item.find_element(By.CSS_SELECTOR, "a[data-test='fop-product-link']").get_attribute("href")
-                url = f"https://groceries.morrisons.com{rel_link}" if rel_link.startswith("/products") else rel_link
+        def add_products(items):
+            page_data = []
+            for item in items:
+                rel_link = item["URL"]
+                url = f"{BASE_URL}{rel_link}" if rel_link.startswith("/products") else rel_link
 
-                if url in seen_urls:
+                if not seen.add(url):
                     continue
 
                 product = {
-                    "Name": name,
-                    "Price": price,
-                    "Unit Price": unit_price,
+                    "Name": item["Name"],
+                    "Price": item["Price"],
+                    "Unit Price": item["Unit Price"],
                     "URL": url,
                     "Scraped At": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
                 }
 
                 page_data.append(product)
                 all_data.append(product)
-                seen_urls.add(url)
-            except Exception as e:
-                print(f"Error scraping product: {e}")
-
-        if page_data:
-            emergency_data[:] = all_data
-            print(f" Scroll #{scroll_count} scraped {len(page_data)} new products (Total: {len(all_data)})")
-            total_scraped += len(page_data)
-            return True
-        else:
-            print(f"No new products found at Scroll #{scroll_count}, stopping.")
-            return False
 
-        wait_time *= 1.5
+            if page_data:
+                journal.append(page_data)
+                progress.products(page_data)
+                if store:
+                    store.write_batch(page_data)
+            print(f" Scroll #{harvester.scrolls} scraped {len(page_data)} new products (Total: {len(all_data)})")
 
-    while True:
-        if not scroll_and_scrape():
-            break
-
-    print(" Final save...")
-    save_data_batch(all_data, base_filename, final=True)
-    atexit.unregister(emergency_save)
-    driver.quit()
-    print(" Browser closed.")
+        try:
+            # Stops once the list is scrolled to the bottom and no more tiles arrive within 8s
+            harvester.run(add_products, wait=8)
+        except Exception as e:
+            print(f"Error while scrolling results: {e}")
+    finally:
+        # Runs even if the search failed, so the session goes back and the rows are saved
+        print(" Final save...")
+        journal.close()
+        if store:
+            store.close()
+        save_data_batch(all_data, base_filename, final=True)
+        atexit.unregister(emergency_save)
+        seen.close()
+        emergency_driver = None
+        if driver is not None:
+            pool.checkin(driver)
+            print(" Browser returned to pool.")
+
+
+def scrape(query, options=None):
+    """Dashboard entry point: run a search on a worker thread, yielding progress events."""
+    return progress.run(scrape_morrisons_products, query, options)
 
 
 if __name__ == "__main__":
+    # Emergency save on Ctrl+C or kill only applies to command-line runs
+    signal.signal(signal.SIGINT, emergency_save)
+    signal.signal(signal.SIGTERM, emergency_save)
+    atexit.register(emergency_save)
     print("Starting Morrisons Scraper")
     print("=" * 50)
     print("Ctrl+C anytime to save and quit safely.")
-    print("Data saves per scroll to CSV/Excel.")
+    print("Data is checkpointed per scroll; CSV/Excel are written at the end.")
     print("=" * 50)
     try:
         scrape_morrisons_products()
@@ -0,0 +1,97 @@
+import json
+import base64
+
+# Responses a browser has received, read from Chrome's performance log. get_log("performance")
+# hands out each entry only once, so everything that needs the network traffic (recorder.py,
+# api_capture.py) registers a listener here and poll() feeds them all from a single read.
+# poll() runs around navigations and scrolls (polite_get, polite_click, TileHarvester.collect) and when a
+# session goes back to the pool.
+
+_listeners = []
+_pending = {}  # id(driver) -> {requestId: response details waiting for loadingFinished}
+
+
+def enable(options):
+    """Turn on the performance log for drivers built from these ChromeOptions."""
+    options.set_capability("goog:loggingPrefs", {"performance": "ALL"})
+    return options
+
+
+def add_listener(fn):
+    """Call fn(driver, response) with every response a polled driver finishes loading."""
+    if fn not in _listeners:
+        _listeners.append(fn)
+
+
+class Response:
+    """One finished response. The body is only fetched from Chrome if a listener asks for it."""
+
+    def __init__(self, driver, request_id, method, url, status, headers=None, mime=None):
+        self.driver = driver
+        self.request_id = request_id
+        self.method = method
+        self.url = url
+        self.status = status
+        self.headers = headers or {}
+        self.mime = mime or ""
+        self._body = None if request_id else b""
+
+    def body(self):
+        """The body as bytes, or None once Chrome has dropped it from its buffer."""
+        if self._body is None and self.request_id:
+            try:
+                result = self.driver.execute_cdp_cmd("Network.getResponseBody", {"requestId": self.request_id})
+            except Exception:
+                self.request_id = None  # Evicted, or a response without a body
+                return None
+            body = result.get("body", "")
+            self._body = base64.b64decode(body) if result.get("base64Encoded") else body.encode("utf-8")
+        return self._body
+
+
+def _finished(driver, logs):
+    state = _pending.setdefault(id(driver), {})
+    for log in logs:
+        message = json.loads(log["message"]).get("message", {})
+        method, params = message.get("method"), message.get("params", {})
+        request_id = params.get("requestId")
+        if method == "Network.requestWillBeSent":
+            redirect = params.get("redirectResponse")
+            if redirect:
+                # The 3xx itself never gets a body or a loadingFinished event
+                yield Response(driver, None, params["request"]["method"], redirect["url"], redirect["status"], redirect.get("headers"))
+            state[request_id] = {"method": params["request"]["method"]}
+        elif method == "Network.responseReceived":
+            response = params["response"]
+            state.setdefault(request_id, {"method": "GET"}).update(
+                url=response["url"], status=response["status"], headers=response.get("headers"), mime=response.get("mimeType"))
+        elif method == "Network.loadingFailed":
+            state.pop(request_id, None)
+        elif method == "Network.loadingFinished":
+            entry = state.pop(request_id, None)
+            if entry and entry.get("url", "").startswith("http"):
+                yield Response(driver, request_id, entry["method"], entry["url"], entry["status"], entry["headers"], entry.get("mime"))
+
+
+def poll(driver):
+    """Hand the responses `driver` has finished loading since the last poll to the listeners. Returns how many."""
+    if not _listeners:
+        return 0
+    try:
+        logs = driver.get_log("performance")
+    except Exception:
+        return 0  # Driver not created with the performance log enabled
+    count = 0
+    for response in _finished(driver, logs):
+        count += 1
+        for listener in _listeners:
+            try:
+                listener(driver, response)
+            except Exception as e:
+                print(f"Network log listener failed on {response.url}: {e}")
+    return count
+
+
+def forget(driver):
+    """Drop the half-finished requests kept for a driver that is being quit."""
+    _pending.pop(id(driver), None)
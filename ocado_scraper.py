@@ -1,22 +1,90 @@
-import time
 import pandas as pd
 from selenium import webdriver
 from selenium.webdriver.common.by import By
 from selenium.webdriver.chrome.options import Options
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
-from selenium.common.exceptions import TimeoutException, NoSuchElementException
+from selenium.common.exceptions import TimeoutException
 import os
+import re
 from datetime import datetime
 import signal
 import sys
 import atexit
+import driver_pool
+from extraction import field
+from harvest import TileHarvester
+from waits import wait_for_dom_quiet, wait_for_tile_count, wait_for_count_growth, count_tiles
+from politeness import polite_get, throttle
+from dedup import DedupIndex, persist_path
+from journal import CheckpointJournal
+import excel_writer
+import parquet_store
+import progress
+import recorder
+import metrics
+import api_capture
+from api_capture import ApiSource, json_field, money
+
+# OCADO_BASE_URL overrides the site, e.g. for load tests against benchmarks/simulator.py
+BASE_URL = os.environ.get("OCADO_BASE_URL", "https://www.ocado.com").rstrip("/")
+HOME_URL = f"{BASE_URL}/"
+
+# Fields read from each product tile, all in a single execute_script call.
+# Name and URL are required, so tiles that have not rendered yet are read on a later scroll.
+PRODUCT_TILE = "li.fops-item.fops-item--cluster"
+SHOW_MORE = "button.btn-primary.show-more"
+PRODUCT_FIELDS = {
+    "Name": field(".fop-title span:first-child", default=None),
+    "URL": field(".fop-contentWrapper > a", "href", default=None),
+    "Title": field(".fop-dietary span", "title"),
+    "Weight": field(".fop-catch-weight"),
+    "Price": field(".fop-price"),
+    "Unit Price": field(".fop-unit-price"),
+    "Review": field(".fop-rating-inner", "title", "No reviews"),
+    "Review Count": field(".fop-rating__count"),
+    "Shelf Life": field(".fop-life"),
+    "Promo": field(".fop-row-promo span"),
+}
+
+# Tiles are filled in batches from Ocado's product lookups as the list scrolls; read with
+# API_CAPTURE=1 (see api_capture.py). Several names are tried for fields whose key has varied.
+def format_unit_price(unit):
+    if not isinstance(unit, dict) or not unit.get("price"):
+        return None
+    per = unit.get("per")
+    return f"({money(unit['price'])} {per})" if per else f"({money(unit['price'])})"
+
+def product_url(product):
+    """The product page: the API's own link if it has one, else the /products/<name>-<sku> form the tiles use."""
+    url = product.get("url") or product.get("productUrl")
+    if url or not product.get("sku"):
+        return url
+    slug = re.sub(r"[^a-z0-9]+", "-", str(product.get("name", "")).lower()).strip("-")
+    return f"/products/{slug}-{product['sku']}" if slug else f"/products/{product['sku']}"
+
+API_PRODUCTS = ApiSource(
+    ["/webshop/api/v1/products", "/api/webproductpagews/"],
+    {
+        "Name": json_field("name"),
+        "URL": product_url,
+        "Title": json_field("dietary.0.name", default=""),
+        "Weight": json_field(["catchWeight", "packSizeDescription"], default=""),
+        "Price": json_field(["price.current", "price.amount"], money, default=""),
+        "Unit Price": json_field("price.unit", format_unit_price, default=""),
+        "Review": json_field(["reviewStats.averageRating", "reviewStats.average"], str, "No reviews"),
+        "Review Count": json_field(["reviewStats.count", "reviewStats.totalReviews"], str, default=""),
+        "Shelf Life": json_field(["shelfLife", "life"], default=""),
+        "Promo": json_field(["promotions.0.description", "promotions.0.text"], default=""),
+    },
+)
 
 # Global variables for emergency save
 emergency_data = []
 emergency_filename_base = ""
 emergency_driver = None
 
+@metrics.timed("save")
 def save_data_batch(data_to_save, base_filename):
     """
     Saves a batch of data to both CSV and Excel files.
@@ -42,6 +110,7 @@ def save_data_batch(data_to_save, base_filename):
     try:
         df.to_csv(csv_filename, index=False, encoding='utf-8-sig') # utf-8-sig for better Excel compatibility
         print(f"Successfully saved {len(df)} products to CSV: {csv_filename}")
+        progress.saved(csv_filename, len(df))
         csv_saved = True
     except Exception as e:
         print(f"CRITICAL: Error saving to CSV: {e}")
@@ -50,8 +119,9 @@ def save_data_batch(data_to_save, base_filename):
     try:
         # This requires the 'openpyxl' library to be installed: pip install openpyxl
         import openpyxl
-        df.to_excel(excel_filename, index=False)
-        print(f"Successfully saved {len(df)} products to Excel: {excel_filename}")
+        # Hand the workbook to the background writer so scraping never waits on openpyxl
+        excel_writer.submit(df, excel_filename)
+        print(f"Queued {len(df)} products for Excel export: {excel_filename}")
         excel_saved = True
     except ImportError:
         # This is just a warning, not a script-breaking failure.
@@ -84,30 +154,12 @@ def emergency_save(signum=None, frame=None):
         except:
             pass
     
+    excel_writer.flush()
     print("Script terminated. Check for saved files!")
     sys.exit(0)
 
 
-def scrape_ocado_products():
-    # Get user input for search query
-    query = input("Enter your search query: ").strip()
-    if not query:
-        query = "bread"  # Default fallback
-        print(f"No query entered. Using default query: '{query}'")
-    
-    # Create a base filename (without extension) for all save operations
-    base_output_file = f"ocado_{query.replace(' ', '_')}_{datetime.now().strftime('%Y%m%d')}"
-    
-    # Setup global variables for emergency save
-    global emergency_data, emergency_filename_base, emergency_driver
-    emergency_filename_base = base_output_file
-    
-    # Register emergency save handlers
-    signal.signal(signal.SIGINT, emergency_save)  # Handles Ctrl+C
-    signal.signal(signal.SIGTERM, emergency_save) # Handles termination
-    atexit.register(emergency_save)              # Handles normal or unexpected script exit
-    
-    # Setup browser
+def create_driver():
     options = Options()
     #options.add_argument("--start-maximized")
     options.add_argument("--headless")  # Run the browser in the background
@@ -115,190 +167,166 @@ def scrape_ocado_products():
     options.add_argument("--disable-blink-features=AutomationControlled")
     options.add_argument("--no-sandbox")
     options.add_argument("--disable-dev-shm-usage")
-    driver = webdriver.Chrome(options=options)
-    emergency_driver = driver  # Set global reference for emergency cleanup
-    wait = WebDriverWait(driver, 15)
+    recorder.configure(options)
+    api_capture.configure(options)
+    return webdriver.Chrome(options=options)
 
-    url = f"https://www.ocado.com/search?entry={query}"
-    print(f"Searching for: {query}")
-    print(f"Opening URL: {url}")
-    driver.get(url)
 
-    # Accept cookies
+@metrics.timed("cookie_consent")
+def accept_cookies(driver):
+    """Click the OneTrust consent button if it is shown."""
     try:
-        cookie_button = wait.until(EC.element_to_be_clickable((By.ID, "onetrust-accept-btn-handler")))
+        cookie_button = WebDriverWait(driver, 15).until(EC.element_to_be_clickable((By.ID, "onetrust-accept-btn-handler")))
         cookie_button.click()
         print("Accepted cookies.")
     except TimeoutException:
         print("Cookie button not found or already accepted.")
-    
-    print("Waiting 7.5 seconds for the site to load...")
-    time.sleep(7.5)
 
-    all_products_data = []
-    scroll_count = 0
-    max_scrolls_per_cycle = 20
-    last_saved_count = 0
+
+def warm_up(driver):
+    """Open the home page and accept cookies so pooled sessions start ready to search."""
+    polite_get(driver, HOME_URL)
+    accept_cookies(driver)
+
+
+def get_driver_pool():
+    return driver_pool.get_pool("Ocado", create_driver, warm_up)
+
+
+def scrape_ocado_products(query=None):
+    # Get user input for search query
+    if query is None:
+        query = input("Enter your search query: ")
+    query = query.strip()
+    if not query:
+        query = "bread"  # Default fallback
+        print(f"No query entered. Using default query: '{query}'")
     
+    # Create a base filename (without extension) for all save operations
+    base_output_file = f"ocado_{query.replace(' ', '_')}_{datetime.now().strftime('%Y%m%d')}"
+    
+    # Setup global variables for emergency save
+    global emergency_data, emergency_filename_base, emergency_driver
+    emergency_filename_base = base_output_file
+    
+    all_products_data = []
+    emergency_data = all_products_data  # Shared reference, nothing to copy per scroll
+    seen = DedupIndex(persist_path("ocado"))
+    journal = CheckpointJournal(base_output_file)
+    store = parquet_store.open_writer("ocado", query)  # None unless PARQUET_STORE_DIR is set
+
+    pool = get_driver_pool()
+    driver = None
+    harvester = None
+
+    def add_products(items):
+        print(f"Scroll {harvester.scrolls} ({harvester.total} tiles loaded)")
+        # Only products whose URL has not been seen yet come back
+        new_products = scrape_current_products(items, harvester.scrolls, seen)
+        if new_products:
+            all_products_data.extend(new_products)
+            # Checkpoint only the new rows; CSV/Excel are written once at the end
+            journal.append(new_products)
+            progress.products(new_products)
+            if store:
+                store.write_batch(new_products)
+            print(f"--> Found {len(new_products)} new products. Total: {len(all_products_data)}")
+
+    def show_more():
+        """Click "Show more" at the end of the list. Returns True if more tiles loaded."""
+        buttons = driver.find_elements(By.CSS_SELECTOR, SHOW_MORE)
+        if not buttons or not buttons[0].is_displayed():
+            print(" No more 'Show more' buttons found. All products are loaded.")
+            return False
+        try:
+            driver.execute_script("arguments[0].scrollIntoView({block: 'center'});", buttons[0])
+            tiles_before = count_tiles(driver, PRODUCT_TILE)
+            throttle(HOME_URL)
+            buttons[0].click()
+            print("Clicked 'Show more' button. Waiting for new products to load...")
+            return wait_for_count_growth(driver, PRODUCT_TILE, tiles_before, timeout=5) > tiles_before
+        except Exception as e:
+            print(f" Error clicking 'Show more' button: {e}")
+            return False
+
     try:
-        while True:
-            print(f"Starting scroll cycle {scroll_count // max_scrolls_per_cycle + 1}")
-            
-            # Update emergency data continuously
-            emergency_data = all_products_data.copy()
-            
-            # Perform scrolling and data collection
-            for scroll in range(max_scrolls_per_cycle):
-                scroll_count += 1
-                print(f"Scroll {scroll + 1}/{max_scrolls_per_cycle} (Total: {scroll_count})")
-                
-                driver.execute_script("window.scrollBy(0, window.innerHeight/3);")
-                time.sleep(4)
-                
-                current_products = scrape_current_products(driver, wait, scroll_count, all_products_data)
-                
-                # Add new products, avoiding duplicates by checking the URL
-                existing_urls = {p['URL'] for p in all_products_data}
-                new_products = [p for p in current_products if p['URL'] not in existing_urls]
-                if new_products:
-                    all_products_data.extend(new_products)
-                    print(f"--> Found {len(new_products)} new products. Total: {len(all_products_data)}")
-                
-                # Update emergency data with the latest products
-                emergency_data = all_products_data.copy()
-                
-                # Check if we have a new batch of 20 products to save
-                current_count = len(all_products_data)
-                if current_count >= last_saved_count + 20:
-                    products_to_save_count = (current_count // 20) * 20
-                    
-                    success = save_data_batch(all_products_data[:products_to_save_count], base_output_file)
-                    if success:
-                        last_saved_count = products_to_save_count
-                        print(f"Progress: {last_saved_count} products saved. {current_count - last_saved_count} pending next batch.")
-                    else:
-                        print(f"Batch save failed. Data remains in memory. Will retry on next trigger.")
-            
-            # After a scroll cycle, check for a "Show more" button
-            print("Looking for 'Show more' button...")
-            try:
-                show_more_button = wait.until(EC.element_to_be_clickable((By.CSS_SELECTOR, "button.btn-primary.show-more")))
-                driver.execute_script("arguments[0].scrollIntoView({behavior: 'smooth', block: 'center'});", show_more_button)
-                time.sleep(3)
-                
-                show_more_button.click()
-                print("Clicked 'Show more' button.")
-                print(" Waiting 5 seconds for new products to load...")
-                time.sleep(5)
-                
-            except TimeoutException:
-                print(" No more 'Show more' buttons found. All products are loaded.")
-                break # Exit the main while loop
-            except Exception as e:
-                print(f" Error clicking 'Show more' button: {e}")
-                break # Exit on error
+        # Check out a warm browser (cookies already accepted) from the pool
+        driver = pool.checkout()
+        emergency_driver = driver  # Set global reference for emergency cleanup
+        api_capture.watch(driver, API_PRODUCTS)  # No-op unless API_CAPTURE is on
+
+        url = f"{BASE_URL}/search?entry={query}"
+        print(f"Searching for: {query}")
+        print(f"Opening URL: {url}")
+        polite_get(driver, url)
 
+        print("Waiting for the first products to load...")
+        wait_for_tile_count(driver, PRODUCT_TILE, 1, timeout=7.5)
+        wait_for_dom_quiet(driver, timeout=3)
+
+        # Each scroll only reads the tiles added since the previous one
+        harvester = TileHarvester(driver, PRODUCT_TILE, PRODUCT_FIELDS, HOME_URL)
+        harvester.run(add_products, load_more=show_more)
     except KeyboardInterrupt:
-        # The atexit handler will automatically call emergency_save
-        print(f"\n Scraping interrupted by user! Initiating emergency save...")
+        print(f"\n Scraping interrupted by user! Saving what we have...")
     except Exception as e:
         print(f"\n An unexpected error occurred: {e}")
-        # The atexit handler will automatically call emergency_save
-
-    # Final save operation to catch any remaining products
-    print("\n Scraping process finished. Performing final save.")
-    if all_products_data:
-        success = save_data_batch(all_products_data, base_output_file)
-        if success:
-            print(f" Scraping completed successfully! Total unique products scraped: {len(all_products_data)}")
-            print(f" Data saved to {base_output_file}.csv (and .xlsx if possible).")
+        raise  # After the final save below, so the run is reported as failed
+    finally:
+        # Final save operation to catch any remaining products, even after an error
+        print("\n Scraping process finished. Performing final save.")
+        journal.close()
+        if store:
+            store.close()
+        if all_products_data:
+            success = save_data_batch(all_products_data, base_output_file)
+            if success:
+                print(f" Scraping completed successfully! Total unique products scraped: {len(all_products_data)}")
+                print(f" Data saved to {base_output_file}.csv (and .xlsx if possible).")
+            else:
+                print(f"\n Final save failed. Check logs for errors. Emergency save might have created a backup.")
         else:
-            print(f"\n Final save failed. Check logs for errors. Emergency save might have created a backup.")
-    else:
-        print(" No products were scraped.")
+            print(" No products were scraped.")
 
-    # Clean up
-    atexit.unregister(emergency_save) # Unregister to prevent double-saving on normal exit
-    emergency_driver = None
-    driver.quit()
-    print(" Browser closed successfully.")
+        # Clean up
+        atexit.unregister(emergency_save) # Unregister to prevent double-saving on normal exit
+        seen.close()
+        emergency_driver = None
+        if driver is not None:
+            api_capture.unwatch(driver)
+            pool.checkin(driver)
+            print(" Browser returned to pool.")
 
 
-def scrape_current_products(driver, wait, scroll_num, all_products_data):
-    """Scrape products currently visible on the page."""
+def scrape_current_products(items, scroll_num, seen):
+    """Keep the newly harvested tiles whose URL is not yet in the `seen` index."""
     products_on_page = []
-    try:
-        product_elements = driver.find_elements(By.CSS_SELECTOR, "li.fops-item.fops-item--cluster")
-        
-        for product_element in product_elements:
-            try:
-                # Scrape essential data first to check for existence
-                product_url = safe_get_attribute(product_element, ".fop-contentWrapper > a", "href", "N/A", wait_time=0.5)
-                
-                # Check if this product URL has already been processed to avoid redundant scraping
-                existing_urls = {p['URL'] for p in all_products_data}
-                if product_url in existing_urls:
-                    continue
-                    
-                # Scrape the rest of the data
-                name = safe_get_text(product_element, ".fop-title span:first-child", "N/A")
-                title = safe_get_attribute(product_element, ".fop-dietary span", "title", "N/A")
-                weight = safe_get_text(product_element, ".fop-catch-weight", "N/A")
-                price = safe_get_text(product_element, ".fop-price", "N/A")
-                unit_price = safe_get_text(product_element, ".fop-unit-price", "N/A")
-                review = safe_get_attribute(product_element, ".fop-rating-inner", "title", "No reviews")
-                review_count = safe_get_text(product_element, ".fop-rating__count", "N/A")
-                shelf_life = safe_get_text(product_element, ".fop-life", "N/A")
-                promo = safe_get_text(product_element, ".fop-row-promo span", "N/A")
-                
-                if name != "N/A" and product_url != "N/A":
-                    products_on_page.append({
-                        "Name": name,
-                        "URL": product_url,
-                        "Title": title,
-                        "Weight": weight,
-                        "Price": price,
-                        "Unit Price": unit_price,
-                        "Review": review,
-                        "Review Count": review_count,
-                        "Shelf Life": shelf_life,
-                        "Promo": promo,
-                        "Scraped_at_Scroll": scroll_num,
-                        "Scraped_at": datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-                    })
-                
-            except Exception as e:
-                print(f" Error scraping an individual product: {e}")
-                continue
-                
-    except Exception as e:
-        print(f" Error finding product elements on page: {e}")
-    
+    for product in items:
+        if seen.add(product["URL"]):
+            product["Scraped_at_Scroll"] = scroll_num
+            product["Scraped_at"] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+            products_on_page.append(product)
     return products_on_page
 
-def safe_get_text(parent_element, selector, default="N/A", wait_time=1.5):
-    """Safely get text from a child element."""
-    try:
-        element = parent_element.find_element(By.CSS_SELECTOR, selector)
-        return element.text.strip() if element.text and element.text.strip() else default
-    except NoSuchElementException:
-        return default
 
-def safe_get_attribute(parent_element, selector, attribute, default="N/A", wait_time=1.5):
-    """Safely get an attribute from a child element."""
-    try:
-        element = parent_element.find_element(By.CSS_SELECTOR, selector)
-        attr_value = element.get_attribute(attribute)
-        return attr_value.strip() if attr_value and attr_value.strip() else default
-    except NoSuchElementException:
-        return default
+def scrape(query, options=None):
+    """
+    Entry point for running inside the dashboard process.
+    Yields the scraper's log lines and each batch of new products (see progress.run).
+    """
+    return progress.run(scrape_ocado_products, query, options)
 
 
 if __name__ == "__main__":
+    # Emergency save on Ctrl+C or kill only applies to command-line runs
+    signal.signal(signal.SIGINT, emergency_save)
+    signal.signal(signal.SIGTERM, emergency_save)
+    atexit.register(emergency_save)
     print(" Starting Enhanced Ocado Scraper")
     print("=" * 50)
     print(" Press Ctrl+C at any time to safely interrupt and save your data.")
-    print(" Data is saved in batches of 20 to both CSV and Excel (if available).")
+    print(" New products are checkpointed to an .ndjson journal as they arrive.")
+    print(" CSV and Excel (if available) are written once at the end.")
     print("=" * 50)
     
     try:
@@ -0,0 +1,144 @@
+import os
+import json
+import uuid
+from datetime import datetime
+from urllib.parse import quote
+
+from queries import normalize_query
+
+# Optional dependency: everything here is a no-op unless pyarrow is installed
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    import pyarrow.dataset as ds
+except ImportError:
+    pa = None
+
+# Set PARQUET_STORE_DIR to also write every run into a partitioned Parquet dataset
+STORE_DIR = os.environ.get("PARQUET_STORE_DIR", "")
+
+# Scraper column names mapped onto the shared schema. Anything else goes into `extra` as JSON.
+COLUMN_MAP = {
+    "Name": "name",
+    "Price": "price",
+    "Unit Price": "unit_price",
+    "Price Per": "unit_price",
+    "URL": "url",
+    "Page": "page",
+    "Scraped At": "scraped_at",
+    "Scraped_at": "scraped_at",
+}
+
+if pa is not None:
+    # Columns stored in each file; retailer/date/query live in the directory names
+    FILE_SCHEMA = pa.schema([
+        ("name", pa.string()),
+        ("price", pa.string()),
+        ("unit_price", pa.string()),
+        ("url", pa.string()),
+        ("page", pa.int32()),
+        ("scraped_at", pa.timestamp("s")),
+        ("extra", pa.string()),
+    ])
+    PARTITION_SCHEMA = pa.schema([
+        ("retailer", pa.string()),
+        ("date", pa.string()),
+        ("query", pa.string()),
+    ])
+
+
+def _to_record(row):
+    record = {"name": None, "price": None, "unit_price": None, "url": None, "page": None, "scraped_at": None}
+    extra = {}
+    for key, value in row.items():
+        column = COLUMN_MAP.get(key)
+        if column is None:
+            extra[key] = value
+        elif column == "scraped_at" and isinstance(value, str):
+            try:
+                record[column] = datetime.strptime(value, "%Y-%m-%d %H:%M:%S")
+            except ValueError:
+                record[column] = None
+        elif column == "page":
+            record[column] = int(value) if value not in (None, "") else None
+        else:
+            record[column] = value
+    record["extra"] = json.dumps(extra, ensure_ascii=False, default=str) if extra else None
+    return record
+
+
+class ParquetResultWriter:
+    """
+    Writes one run to <root>/retailer=<r>/date=<YYYY-MM-DD>/query=<q>/part-*.parquet.
+    Each write_batch call becomes one row group, so rows land on disk as they arrive.
+    """
+
+    def __init__(self, retailer, query, root):
+        self.retailer = retailer.lower()
+        self.query = normalize_query(query)
+        partition_dir = os.path.join(
+            root,
+            f"retailer={quote(self.retailer, safe='')}",
+            f"date={datetime.now().strftime('%Y-%m-%d')}",
+            f"query={quote(self.query, safe='')}",
+        )
+        os.makedirs(partition_dir, exist_ok=True)
+        self.path = os.path.join(partition_dir, f"part-{datetime.now().strftime('%H%M%S')}-{uuid.uuid4().hex[:8]}.parquet")
+        self.rows_written = 0
+        self._writer = None
+
+    def write_batch(self, rows):
+        if not rows:
+            return 0
+        table = pa.Table.from_pylist([_to_record(row) for row in rows], schema=FILE_SCHEMA)
+        if self._writer is None:
+            self._writer = pq.ParquetWriter(self.path, FILE_SCHEMA, compression="zstd")
+        self._writer.write_table(table)
+        self.rows_written += len(rows)
+        return len(rows)
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+            print(f"Parquet: wrote {self.rows_written} rows to {self.path}")
+
+
+def open_writer(retailer, query, root=None):
+    """Return a writer for this run, or None when the store is not enabled or pyarrow is missing."""
+    root = root or STORE_DIR
+    if not root:
+        return None
+    if pa is None:
+        print("Parquet store needs pyarrow. Skipping. To enable, run: pip install pyarrow")
+        return None
+    return ParquetResultWriter(retailer, query, root)
+
+
+def read_results(root=None, retailer=None, query=None, date_from=None, date_to=None, columns=None, where=None):
+    """
+    Load results into a DataFrame. retailer/query/date filters prune whole partitions and
+    `where` (a pyarrow.dataset expression) is pushed down to the row groups.
+    Example: read_results(retailer="ocado", date_from="2025-06-01", columns=["name", "price"])
+    """
+    if pa is None:
+        raise ImportError("read_results needs pyarrow: pip install pyarrow")
+    root = root or STORE_DIR
+    dataset = ds.dataset(root, format="parquet", partitioning=ds.partitioning(PARTITION_SCHEMA, flavor="hive"))
+
+    conditions = []
+    if retailer:
+        conditions.append(ds.field("retailer") == retailer.lower())
+    if query:
+        conditions.append(ds.field("query") == normalize_query(query))
+    if date_from:
+        conditions.append(ds.field("date") >= str(date_from))
+    if date_to:
+        conditions.append(ds.field("date") <= str(date_to))
+    if where is not None:
+        conditions.append(where)
+
+    expression = None
+    for condition in conditions:
+        expression = condition if expression is None else expression & condition
+    return dataset.to_table(columns=columns, filter=expression).to_pandas()
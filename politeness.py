@@ -0,0 +1,119 @@
+import os
+import time
+import random
+import threading
+from urllib.parse import urlparse
+
+import metrics
+import netlog
+import progress
+import recorder
+
+# Default crawl rate per retailer domain: `rate` actions per second, up to `burst`
+# back-to-back, plus up to `jitter` random seconds on every action.
+DEFAULT_RATE = float(os.environ.get("POLITENESS_RATE", 1.0))
+DEFAULT_BURST = int(os.environ.get("POLITENESS_BURST", 3))
+DEFAULT_JITTER = float(os.environ.get("POLITENESS_JITTER", 0.25))
+
+# Per-domain overrides. Tesco sits behind Akamai, which flags fast, regular traffic.
+DOMAIN_LIMITS = {
+    "www.tesco.com": {"rate": 0.3, "burst": 1, "jitter": 3.0},
+}
+
+_buckets = {}
+_buckets_lock = threading.Lock()
+
+
+class TokenBucket:
+    """Classic token bucket. Callers that find it empty reserve a future slot and sleep until then."""
+
+    def __init__(self, rate, burst, jitter=0.0):
+        self.rate = rate
+        self.burst = burst
+        self.jitter = jitter
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Block until an action is allowed (or the search is cancelled). Returns the number of seconds waited."""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            delay = 0.0 if self._tokens >= 0 else -self._tokens / self.rate
+        if self.jitter:
+            delay += random.uniform(0, self.jitter)
+        if delay > 0:
+            # A reserved slot can be many seconds out when fan-out workers queue up behind each other
+            deadline = time.monotonic() + delay
+            while not progress.cancelled():
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                time.sleep(min(remaining, 1.0))
+        return delay
+
+
+def domain_of(url_or_host):
+    if "://" in url_or_host:
+        return urlparse(url_or_host).hostname or url_or_host
+    return url_or_host
+
+
+def configure(domain, rate=None, burst=None, jitter=None):
+    """Change the limits for one domain. Takes effect for the next action."""
+    limits = dict(DOMAIN_LIMITS.get(domain, {}))
+    for key, value in (("rate", rate), ("burst", burst), ("jitter", jitter)):
+        if value is not None:
+            limits[key] = value
+    DOMAIN_LIMITS[domain] = limits
+    with _buckets_lock:
+        _buckets.pop(domain, None)
+
+
+def get_bucket(domain):
+    with _buckets_lock:
+        bucket = _buckets.get(domain)
+        if bucket is None:
+            limits = DOMAIN_LIMITS.get(domain, {})
+            bucket = TokenBucket(
+                limits.get("rate", DEFAULT_RATE),
+                limits.get("burst", DEFAULT_BURST),
+                limits.get("jitter", DEFAULT_JITTER),
+            )
+            _buckets[domain] = bucket
+        return bucket
+
+
+def throttle(url_or_host):
+    """
+    Wait for the domain's next slot before an action that hits the retailer's servers
+    (navigation, pagination click, scroll that loads more products). In-page DOM reads
+    never need this.
+    """
+    delay = get_bucket(domain_of(url_or_host)).acquire()
+    metrics.observe_phase("throttle", delay)
+    return delay
+
+
+def polite_click(driver, element, url_or_host, js=False):
+    """
+    Click something that loads a new page (Next, Try again) at the domain's pace. The network log
+    is read first, as in polite_get, or the current page's late responses are lost to the navigation.
+    """
+    netlog.poll(driver)
+    throttle(url_or_host)
+    if js:
+        driver.execute_script("arguments[0].click();", element)  # Not intercepted by overlays
+    else:
+        element.click()
+
+
+def polite_get(driver, url):
+    netlog.poll(driver)  # Late responses from the previous page, before navigating drops them
+    throttle(url)
+    with metrics.phase("page_load"):
+        driver.get(recorder.navigable(url))
+    netlog.poll(driver)
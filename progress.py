@@ -0,0 +1,182 @@
+import os
+import sys
+import time
+import queue
+import threading
+
+# Lets a scraper run in-process (see run()) while its code stays the same as on the command line:
+# print() output and progress events from the scraper's thread are routed to whoever is consuming
+# it, and cancelled() tells the scraper's loops when to stop at the next page or scroll.
+#
+# Event types, in the order a run produces them:
+#   job_started     {"query"}
+#   log             {"line"}                        one line of print() output
+#   page_loaded     {"page", "total_pages", "url"}  a results page (or scroll batch) was read
+#   products_batch  {"rows", "count"}               new records, as saved to the CSV
+#   saved           {"path", "rows"}                results written to disk
+#   finished        {"ok", "error", "cancelled"}
+# Every event except log also carries the run's counters: elapsed (seconds), pages, items,
+# pages_per_sec and items_per_sec.
+
+# Seconds a cancelled scraper gets to save its partial data and stop. After that run() reports
+# it finished anyway, so whoever is consuming it (a scheduler worker) is free for the next search.
+CANCEL_TIMEOUT = float(os.environ.get("CANCEL_TIMEOUT", 30))
+
+_local = threading.local()
+_install_lock = threading.Lock()
+
+
+class Sink:
+    """Where one in-process run's output goes."""
+
+    def __init__(self, cancel=None, retailer=None):
+        self.events = queue.Queue()
+        self.cancel = cancel or threading.Event()
+        self.retailer = retailer  # Labels the run's timings in metrics.py
+        self.started = time.time()
+        self.pages = 0
+        self.items = 0
+        self._lock = threading.Lock()
+
+    def put(self, event):
+        self.events.put(event)
+
+    def record(self, event_type, **fields):
+        """Count the event towards the run's totals and queue it with the current counters."""
+        with self._lock:
+            if event_type == "page_loaded":
+                self.pages += 1
+            elif event_type == "products_batch":
+                self.items += fields.get("count", 0)
+            elapsed = time.time() - self.started
+            event = {"type": event_type, **fields, **self.counters(elapsed)}
+            # Queued under the lock so counters never go backwards when fan-out threads report at once
+            self.events.put(event)
+        return event
+
+    def counters(self, elapsed):
+        return {
+            "elapsed": round(elapsed, 3),
+            "pages": self.pages,
+            "items": self.items,
+            "pages_per_sec": round(self.pages / elapsed, 3) if elapsed > 0 else 0.0,
+            "items_per_sec": round(self.items / elapsed, 3) if elapsed > 0 else 0.0,
+        }
+
+
+def current():
+    return getattr(_local, "sink", None)
+
+
+def attach(sink):
+    """Route this thread's output to `sink`. Helper threads started by a scraper call this with current()."""
+    _local.sink = sink
+    _local.buffer = ""
+
+
+def event(event_type, **fields):
+    """Report a progress event for the current run. A no-op when running from the command line."""
+    sink = current()
+    if sink is not None:
+        sink.record(event_type, **fields)
+
+
+def page_loaded(page=None, total_pages=None, url=None):
+    event("page_loaded", page=page, total_pages=total_pages, url=url)
+
+
+def products(rows):
+    """Report a batch of newly scraped records."""
+    if rows:
+        event("products_batch", rows=list(rows), count=len(rows))
+
+
+def saved(path, rows):
+    event("saved", path=path, rows=rows)
+
+
+def cancelled():
+    """True once an in-process run has been asked to stop; scrapers check this between pages."""
+    sink = current()
+    return sink is not None and sink.cancel.is_set()
+
+
+class _RoutedStdout:
+    """Stands in for sys.stdout: lines printed on a thread with a sink become log events."""
+
+    def __init__(self, stream):
+        self.stream = stream
+
+    def write(self, text):
+        sink = current()
+        if sink is None:
+            return self.stream.write(text)
+        lines = (_local.buffer + text).split("\n")
+        _local.buffer = lines.pop()
+        for line in lines:
+            sink.put({"type": "log", "line": line.rstrip("\r")})
+        return len(text)
+
+    def flush(self):
+        if current() is None:
+            self.stream.flush()
+
+    def __getattr__(self, name):
+        return getattr(self.stream, name)
+
+
+def _install():
+    with _install_lock:
+        if not isinstance(sys.stdout, _RoutedStdout):
+            sys.stdout = _RoutedStdout(sys.stdout)
+
+
+def run(fn, query, options=None):
+    """
+    Run fn(query) on its own thread and yield its events as they happen (see the list at the top),
+    from job_started to finished. options["cancel"] is a threading.Event that asks the scraper
+    to stop early and options["retailer"] names the run in metrics. Closing the generator before
+    the finished event also cancels the run. A scraper still going CANCEL_TIMEOUT seconds after
+    being cancelled is left to stop on its own thread, and run() ends with a cancelled finished event.
+    """
+    options = options or {}
+    _install()
+    sink = Sink(options.get("cancel"), options.get("retailer"))
+    sink.record("job_started", query=query)
+
+    def target():
+        attach(sink)
+        ok, error = True, None
+        try:
+            fn(query)
+        except BaseException as e:
+            print(f"Scraper stopped with an error: {e}")
+            ok, error = False, str(e)
+        finally:
+            if _local.buffer:
+                sink.put({"type": "log", "line": _local.buffer})
+            _local.sink = None
+            sink.record("finished", ok=ok, error=error, cancelled=sink.cancel.is_set())
+
+    threading.Thread(target=target, name=f"scrape-{getattr(fn, '__name__', 'run')}", daemon=True).start()
+    finished = False
+    give_up_at = None
+    try:
+        while not finished:
+            if give_up_at is None and sink.cancel.is_set():
+                give_up_at = time.time() + CANCEL_TIMEOUT
+            try:
+                event = sink.events.get(timeout=1.0)
+            except queue.Empty:
+                event = None
+            if give_up_at is not None and time.time() >= give_up_at and (event is None or event["type"] != "finished"):
+                # Its pooled browser goes back to the pool if the scraper ever reaches its finally block
+                event = sink.record("finished", ok=False, cancelled=True,
+                                    error=f"Scraper did not stop within {CANCEL_TIMEOUT:g}s of being cancelled")
+            if event is None:
+                continue
+            finished = event["type"] == "finished"
+            yield event
+    finally:
+        if not finished:
+            sink.cancel.set()
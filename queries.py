@@ -0,0 +1,3 @@
+def normalize_query(query):
+    """The form a search term is grouped and stored under: lower case, single spaces, no padding."""
+    return " ".join(query.lower().split())
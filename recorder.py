@@ -0,0 +1,249 @@
+import os
+import sys
+import gzip
+import json
+import base64
+import atexit
+import threading
+from collections import Counter
+from urllib.parse import urlsplit
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import netlog
+
+# Record-and-replay for scraper runs.
+#
+# RECORD_ARCHIVE=sessions/asda-milk.jsonl.gz saves every response the browsers (read from Chrome's
+# performance log, see netlog.py) and the HTTP fast path receive.
+# REPLAY_ARCHIVE=<same file> serves those responses instead of the live sites: browsers go through
+# a local proxy and the fast path reads the archive directly, so a run can be repeated offline.
+# Chrome can't be proxied for https:// without intercepting TLS, so replayed pages are browsed
+# over http://. Navigation URLs, redirects and links in text responses are rewritten to match.
+RECORD_ARCHIVE = os.environ.get("RECORD_ARCHIVE", "")
+REPLAY_ARCHIVE = os.environ.get("REPLAY_ARCHIVE", "")
+REPLAY_PORT = int(os.environ.get("REPLAY_PORT", 0))
+
+_TEXT_TYPES = ("text/", "javascript", "json", "xml")
+# Bodies are stored decoded, so the original framing headers no longer apply. HSTS and Alt-Svc
+# would send the replaying browser back to https:// or QUIC.
+_DROP_HEADERS = {
+    "content-encoding", "content-length", "transfer-encoding", "connection", "keep-alive",
+    "strict-transport-security", "alt-svc",
+}
+
+_lock = threading.Lock()
+_writer = None
+_archive = None
+_proxy_url = None
+
+
+def archive_key(method, url):
+    """Archive entries are matched on method, host, path and query. The scheme is ignored."""
+    parts = urlsplit(url)
+    query = f"?{parts.query}" if parts.query else ""
+    return f"{method.upper()} {parts.netloc.lower()}{parts.path or '/'}{query}"
+
+
+def recording():
+    return bool(RECORD_ARCHIVE)
+
+
+def replaying():
+    return bool(REPLAY_ARCHIVE)
+
+
+class ArchiveWriter:
+    """Appends responses to a gzipped JSON-lines file, one response per line. Safe to share between threads."""
+
+    def __init__(self, path):
+        folder = os.path.dirname(os.path.abspath(path))
+        os.makedirs(folder, exist_ok=True)
+        self.path = path
+        self.count = 0
+        self._file = gzip.open(path, "at", encoding="utf-8")
+        self._lock = threading.Lock()
+
+    def add(self, method, url, status, headers, body, mime=None, final_url=None):
+        entry = {
+            "method": method.upper(),
+            "url": url,
+            "final_url": final_url or url,
+            "status": status,
+            "headers": {name: value for name, value in (headers or {}).items() if name.lower() not in _DROP_HEADERS},
+            "mime": mime,
+            "body": base64.b64encode(body or b"").decode("ascii"),
+        }
+        with self._lock:
+            self._file.write(json.dumps(entry) + "\n")
+            self.count += 1
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+
+class ReplayArchive:
+    """
+    Recorded responses by archive_key. A URL requested several times is answered in the order
+    it was recorded, then with its last response, so a replayed run sees what the recorded one saw.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._entries = {}
+        self._served = Counter()
+        self._lock = threading.Lock()
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            for line in f:
+                entry = json.loads(line)
+                entry["body"] = base64.b64decode(entry["body"])
+                self._entries.setdefault(archive_key(entry["method"], entry["url"]), []).append(entry)
+
+    def __len__(self):
+        return sum(len(entries) for entries in self._entries.values())
+
+    def lookup(self, method, url):
+        key = archive_key(method, url)
+        entries = self._entries.get(key)
+        if not entries:
+            return None
+        with self._lock:
+            index = self._served[key]
+            self._served[key] += 1
+        return entries[min(index, len(entries) - 1)]
+
+
+def _get_writer():
+    global _writer
+    if not RECORD_ARCHIVE:
+        return None
+    with _lock:
+        if _writer is None:
+            _writer = ArchiveWriter(RECORD_ARCHIVE)
+            atexit.register(_writer.close)
+            print(f"Recording responses to {RECORD_ARCHIVE}")
+        return _writer
+
+
+def get_archive():
+    global _archive
+    with _lock:
+        if _archive is None and REPLAY_ARCHIVE:
+            _archive = ReplayArchive(REPLAY_ARCHIVE)
+            print(f"Replaying {len(_archive)} recorded responses from {REPLAY_ARCHIVE}")
+        return _archive
+
+
+def record(method, url, status, headers, body, mime=None, final_url=None):
+    """Save one response, e.g. from the HTTP fast path. A no-op unless recording."""
+    writer = _get_writer()
+    if writer is not None:
+        writer.add(method, url, status, headers, body, mime, final_url)
+
+
+def lookup(method, url):
+    """The recorded response for a request while replaying: a dict with status, headers and body (bytes)."""
+    archive = get_archive()
+    return archive.lookup(method, url) if archive is not None else None
+
+
+def _save_response(driver, response):
+    """netlog listener: archive every response the browsers finish loading."""
+    body = response.body()
+    if body is not None:
+        _get_writer().add(response.method, response.url, response.status, response.headers, body, response.mime)
+
+
+def navigable(url):
+    """The URL to load in the browser: http:// while replaying (the proxy can't serve https), else unchanged."""
+    if REPLAY_ARCHIVE and url.startswith("https://"):
+        return "http://" + url[len("https://"):]
+    return url
+
+
+def _to_http(body):
+    return body.replace(b"https://", b"http://").replace(b"https:\\/\\/", b"http:\\/\\/")
+
+
+class _ReplayHandler(BaseHTTPRequestHandler):
+    def _replay(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        if length:
+            self.rfile.read(length)
+        if not self.path.startswith("http"):
+            self.send_error(400, "The replay proxy only serves proxied requests")
+            return
+        entry = lookup(self.command, self.path)
+        if entry is None:
+            self.send_error(404, "Not in the recorded archive")
+            return
+        body = entry["body"]
+        mime = (entry.get("mime") or "").lower()
+        if any(kind in mime for kind in _TEXT_TYPES):
+            body = _to_http(body)
+        self.send_response(entry["status"])
+        for name, value in entry["headers"].items():
+            if name.lower() == "location":
+                value = navigable(value)
+            # Chrome merges repeated headers into one value joined by newlines
+            for part in str(value).split("\n"):
+                self.send_header(name, part)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(body)
+
+    do_GET = do_POST = do_HEAD = do_PUT = do_OPTIONS = _replay
+
+    def do_CONNECT(self):
+        # https:// that slipped past the rewriting; fail fast instead of tunnelling to the live site
+        self.send_error(501, "HTTPS is not replayed")
+
+    def log_message(self, format, *args):
+        pass
+
+
+def replay_proxy():
+    """Start the replay proxy on first use and return its address."""
+    global _proxy_url
+    get_archive()
+    with _lock:
+        if _proxy_url is None:
+            httpd = ThreadingHTTPServer(("127.0.0.1", REPLAY_PORT), _ReplayHandler)
+            httpd.daemon_threads = True
+            threading.Thread(target=httpd.serve_forever, name="replay-proxy", daemon=True).start()
+            _proxy_url = f"http://127.0.0.1:{httpd.server_address[1]}"
+        return _proxy_url
+
+
+def configure(options):
+    """Prepare a scraper's ChromeOptions for recording or replaying. Returns the options unchanged otherwise."""
+    if RECORD_ARCHIVE:
+        netlog.enable(options)
+    if REPLAY_ARCHIVE:
+        options.add_argument(f"--proxy-server={replay_proxy()}")
+        options.add_argument("--proxy-bypass-list=<-loopback>")
+        # Otherwise Chrome tries https:// first for the rewritten http:// URLs
+        options.add_argument("--disable-features=HttpsUpgrades")
+    return options
+
+
+if RECORD_ARCHIVE:
+    netlog.add_listener(_save_response)
+
+
+if __name__ == "__main__":
+    # python recorder.py archive.jsonl.gz -> what a recording contains, per host and status
+    archive = ReplayArchive(sys.argv[1])
+    hosts = Counter()
+    statuses = Counter()
+    size = 0
+    for entries in archive._entries.values():
+        for entry in entries:
+            hosts[urlsplit(entry["url"]).netloc] += 1
+            statuses[entry["status"]] += 1
+            size += len(entry["body"])
+    print(f"{len(archive)} responses, {size / 2**20:.1f} MB of bodies")
+    for host, count in hosts.most_common():
+        print(f"  {count:6d}  {host}")
+    print("Statuses: " + ", ".join(f"{status} x{count}" for status, count in sorted(statuses.items())))
@@ -0,0 +1,86 @@
+import os
+
+# Requests the scrapers' browsers never need to make. Blocking happens inside Chrome through
+# CDP Network.setBlockedURLs, so pages load faster and renderers hold less memory, while the
+# product tiles (HTML, CSS, first-party JS and XHRs) load as usual. Images are blocked by
+# default: the scrapers read image URLs from the tiles' attributes, not the pixels.
+RESOURCE_BLOCKING = os.environ.get("RESOURCE_BLOCKING", "1") != "0"
+DEFAULT_BLOCK_TYPES = tuple(
+    kind.strip() for kind in os.environ.get("BLOCKED_RESOURCE_TYPES", "image,font,media").split(",") if kind.strip()
+)
+
+# setBlockedURLs only matches URLs, so resource types are approximated by file extension.
+# SVG is left alone: pagination arrows and other icon buttons take their size from it.
+TYPE_EXTENSIONS = {
+    "image": (".jpg", ".jpeg", ".png", ".gif", ".webp", ".avif", ".ico"),
+    "font": (".woff", ".woff2", ".ttf", ".otf", ".eot"),
+    "media": (".mp4", ".webm", ".m3u8", ".mp3"),
+}
+
+# Third-party analytics, ads and session replay. Consent (OneTrust/cookielaw) must stay
+# reachable for the cookie button, and retail-media networks can serve sponsored product
+# tiles, so neither is listed here.
+TRACKER_DOMAINS = (
+    "googletagmanager.com",
+    "google-analytics.com",
+    "doubleclick.net",
+    "googleadservices.com",
+    "googlesyndication.com",
+    "connect.facebook.net",
+    "bat.bing.com",
+    "clarity.ms",
+    "hotjar.com",
+    "analytics.tiktok.com",
+    "sc-static.net",
+    "ct.pinterest.com",
+    "quantummetric.com",
+    "contentsquare.net",
+)
+
+# Per-retailer changes to the defaults, keyed by driver pool name:
+#   allow_types / block_types      resource types to load anyway / to block as well
+#   allow_domains / block_domains  tracker domains to let through / extra domains to block
+#   block_urls                     raw setBlockedURLs patterns (wildcards allowed)
+# Co-op saves each tile's image URL; let images load so lazy-loading placeholders are
+# swapped for the real one.
+RETAILER_POLICIES = {
+    "Co-op": {"allow_types": ("image",)},
+}
+
+
+def _domain_patterns(domain):
+    return [f"*://{domain}/*", f"*://*.{domain}/*"]
+
+
+def blocked_patterns(retailer):
+    """The setBlockedURLs patterns for one retailer's browsers."""
+    policy = RETAILER_POLICIES.get(retailer, {})
+    types = [kind for kind in DEFAULT_BLOCK_TYPES if kind not in policy.get("allow_types", ())]
+    types += [kind for kind in policy.get("block_types", ()) if kind not in types]
+    domains = [domain for domain in TRACKER_DOMAINS if domain not in policy.get("allow_domains", ())]
+    domains += list(policy.get("block_domains", ()))
+
+    patterns = []
+    for kind in types:
+        for extension in TYPE_EXTENSIONS.get(kind, ()):
+            patterns += [f"*{extension}", f"*{extension}?*"]
+    for domain in domains:
+        patterns += _domain_patterns(domain)
+    patterns += list(policy.get("block_urls", ()))
+    return patterns
+
+
+def apply(driver, retailer):
+    """Start blocking `retailer`'s unwanted requests in a fresh driver. Returns the patterns applied."""
+    if not RESOURCE_BLOCKING:
+        return []
+    patterns = blocked_patterns(retailer)
+    if not patterns:
+        return []
+    try:
+        driver.execute_cdp_cmd("Network.enable", {})
+        driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": patterns})
+    except Exception as e:
+        print(f"[{retailer}] Could not set up resource blocking, loading everything: {e}")
+        return []
+    return patterns
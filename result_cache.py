@@ -0,0 +1,104 @@
+import os
+import json
+import time
+import threading
+from collections import OrderedDict
+
+from queries import normalize_query
+
+# Results younger than RESULT_CACHE_TTL seconds are replayed as-is. Up to RESULT_CACHE_STALE
+# seconds past that they are still replayed, but the scraper re-runs in the background.
+CACHE_TTL = float(os.environ.get("RESULT_CACHE_TTL", 30 * 60))
+CACHE_STALE = float(os.environ.get("RESULT_CACHE_STALE", 6 * 60 * 60))
+CACHE_SIZE = int(os.environ.get("RESULT_CACHE_SIZE", 200))
+# Set RESULT_CACHE_PATH="" to keep the cache in memory only
+CACHE_PATH = os.environ.get("RESULT_CACHE_PATH", "result_cache.json")
+
+FRESH, STALE = "fresh", "stale"
+
+
+def compact(event):
+    """An event as the cache keeps it: products_batch only keeps its count, not every row."""
+    if event.get("type") == "products_batch" and "rows" in event:
+        event = {key: value for key, value in event.items() if key != "rows"}
+    return event
+
+
+class ResultCache:
+    """
+    Finished scraper runs keyed by (retailer, normalized query), least recently used first out.
+    Each entry keeps the run's progress events so the dashboard can replay them. Product batches
+    are kept without their rows (see compact()); the run's saved event names the file that has them.
+    """
+
+    def __init__(self, path=CACHE_PATH, ttl=CACHE_TTL, stale=CACHE_STALE, max_entries=CACHE_SIZE):
+        self.path = path
+        self.ttl = ttl
+        self.stale = stale
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()  # One writer at a time; readers never wait on the disk
+        self._load()
+
+    @staticmethod
+    def key(retailer, query):
+        return f"{retailer}|{normalize_query(query)}"
+
+    def _load(self):
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                entries = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"Ignoring unreadable result cache {self.path}: {e}")
+            return
+        now = time.time()
+        for key, entry in entries:
+            if "lines" in entry:
+                # Written before runs were cached as events
+                entry["events"] = [{"type": "log", "line": line} for line in entry.pop("lines")]
+            entry["events"] = [compact(event) for event in entry["events"]]
+            if now - entry["created"] < self.ttl + self.stale:
+                self._entries[key] = entry
+
+    def _save(self):
+        if not self.path:
+            return
+        with self._save_lock:
+            with self._lock:
+                entries = list(self._entries.items())
+            # Write a temp file and swap it in so a crash never leaves half a cache behind
+            tmp_path = f"{self.path}.tmp"
+            try:
+                with open(tmp_path, "w", encoding="utf-8") as f:
+                    json.dump(entries, f, ensure_ascii=False)
+                os.replace(tmp_path, self.path)
+            except OSError as e:
+                print(f"Could not persist result cache: {e}")
+
+    def get(self, retailer, query):
+        """Return (entry, FRESH or STALE), or (None, None) on a miss or an expired entry."""
+        key = self.key(retailer, query)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None, None
+            age = time.time() - entry["created"]
+            if age >= self.ttl + self.stale:
+                del self._entries[key]
+                return None, None
+            self._entries.move_to_end(key)
+            return entry, FRESH if age < self.ttl else STALE
+
+    def put(self, retailer, query, events):
+        events = [compact(event) for event in events]
+        entry = {"retailer": retailer, "query": normalize_query(query), "created": time.time(), "events": events}
+        with self._lock:
+            self._entries[self.key(retailer, query)] = entry
+            self._entries.move_to_end(self.key(retailer, query))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        self._save()
+        return entry
@@ -16,14 +16,74 @@ uc.Chrome.__del__ = lambda self: None
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
-from selenium.common.exceptions import TimeoutException, StaleElementReferenceException, NoSuchElementException
+from selenium.common.exceptions import TimeoutException, NoSuchElementException
+
+import driver_pool
+from fanout import fan_out_pages, worker_count, page_urls_from_links, pagination_links
+from extraction import field, compile_extractor
+from waits import wait_for_dom_quiet, wait_for_url_change, wait_for_tile_count
+from politeness import polite_get, polite_click
+from dedup import DedupIndex, persist_path
+from journal import CheckpointJournal
+import excel_writer
+import parquet_store
+import progress
+import recorder
+import metrics
+import api_capture
+from api_capture import ApiSource, json_field, money
 
 warnings.filterwarnings("ignore", category=ResourceWarning)
 
+BASE_URL = os.environ.get("SAINSBURYS_BASE_URL", "https://www.sainsburys.co.uk").rstrip("/")
+HOME_URL = f"{BASE_URL}/gol-ui/groceries"
+
+# Primary selectors first, then fallbacks for older tile layouts
+PRODUCT_TILE = "div.pt__wrapper-inner"
+NAME_SELECTORS = [
+    "h2.pt__info__description a",
+    "a[data-test-id='product-tile-description']",
+    ".pt__info__description a",
+    "h3 a",
+    "a[title]"
+]
+PRODUCT_FIELDS = {
+    "Name": field(NAME_SELECTORS, default=None),
+    "URL": field(NAME_SELECTORS, "href", default=None),
+    "Price": field(["span.pt__cost__retail-price", "[data-test-id='product-tile-price']"]),
+    "Unit Price": field(["span.pt__cost__unit-price-per-measure", "[data-test-id='product-tile-unit-price']"]),
+}
+extract_products = compile_extractor(PRODUCT_TILE, PRODUCT_FIELDS)
+
+# The gol-ui search page fills its grid from this API; read with API_CAPTURE=1 (see api_capture.py)
+def format_unit_price(value):
+    if not isinstance(value, dict) or value.get("price") is None:
+        return None
+    amount = value.get("measure_amount")
+    per = f"{amount:g}{value.get('measure', '')}" if amount not in (None, 1) else value.get("measure", "")
+    return f"{money(value['price'])} / {per}"
+
+API_PRODUCTS = ApiSource(
+    ["/gol-services/product/v1/product?"],
+    {
+        "Name": json_field("name"),
+        "URL": json_field("full_url"),
+        "Price": json_field("retail_price.price", money),
+        "Unit Price": json_field("unit_price", format_unit_price),
+        "Nectar Price": json_field("nectar_price.retail_price", money),
+        "Promo": json_field("promotions.0.strap_line"),
+        "Product ID": json_field("product_uid"),
+    },
+    items="products",
+)
+PAGE_LINKS = "li.ln-c-pagination__item a"
+MAX_PAGES = 100
+
 emergency_data = []
 emergency_filename_base = ""
 emergency_driver = None
 
+@metrics.timed("save")
 def save_data_batch(data_to_save, base_filename, final=False):
     if not data_to_save:
         print("No data to save.")
@@ -36,13 +96,14 @@ def save_data_batch(data_to_save, base_filename, final=False):
     try:
         df.to_csv(csv_file, index=False, encoding="utf-8-sig")
         print(f" Saved CSV: {csv_file}")
+        progress.saved(csv_file, len(df))
     except Exception as e:
         print(f"CSV save failed: {e}")
 
     try:
         import openpyxl
-        df.to_excel(excel_file, index=False)
-        print(f" Saved Excel: {excel_file}")
+        excel_writer.submit(df, excel_file)  # Written on the background thread
+        print(f" Queued Excel export: {excel_file}")
     except Exception as e:
         print(f" Excel save failed: {e}")
     return True
@@ -58,6 +119,7 @@ def emergency_save(signum=None, frame=None):
             emergency_driver.quit()
         except Exception as e:
             print(f"Error during emergency driver quit: {e}")
+    excel_writer.flush()
     sys.exit(0)
 
 def get_current_page_number(driver):
@@ -82,17 +144,7 @@ def get_current_page_number(driver):
         print(f"Error getting page number: {e}")
         return None
 
-def scrape_sainsburys_products():
-    query = input("Search for Sainsbury's product: ").strip() or "milk"
-    encoded_query = quote_plus(query)
-    base_filename = f"sainsburys_{query.replace(' ', '_')}_{datetime.now().strftime('%Y%m%d')}"
-
-    global emergency_data, emergency_filename_base, emergency_driver
-    emergency_filename_base = base_filename
-    signal.signal(signal.SIGINT, emergency_save)
-    signal.signal(signal.SIGTERM, emergency_save)
-    atexit.register(emergency_save)
-
+def create_driver():
     options = uc.ChromeOptions()
     #options.add_argument("--headless=new")  # Modern headless mode
     options.add_argument("--window-size=1920,1080")
@@ -101,41 +153,58 @@ def scrape_sainsburys_products():
     options.add_argument("--disable-dev-shm-usage")
     options.add_argument("--disable-gpu")
     options.add_argument("--disable-extensions")
-    options.add_argument("--disable-images")  # Speed optimization
-    options.add_argument("--disable-javascript")  # Only if site works without JS
-
-    driver = uc.Chrome(options=options, headless=False)
-    emergency_driver = driver
-    wait = WebDriverWait(driver, 15)  # Reduced timeout
-
-    all_data = []
-    seen_urls = set()
-    page_count = 1
-    consecutive_failures = 0
-    max_consecutive_failures = 3
-
-    # Start with page 1
-    url = f"https://www.sainsburys.co.uk/gol-ui/SearchResults/{encoded_query}"
-    print(f"Searching Sainsbury's for: {query}")
-    print(f"Opening URL: {url}")
-    driver.get(url)
+    recorder.configure(options)
+    api_capture.configure(options)
+    return uc.Chrome(options=options, headless=False)
 
+@metrics.timed("cookie_consent")
+def accept_cookies(driver):
     try:
         cookie_btn = WebDriverWait(driver, 8).until(EC.element_to_be_clickable((By.ID, "onetrust-accept-btn-handler")))
         cookie_btn.click()
         print("Accepted cookies.")
-        time.sleep(2)  # Reduced wait time
+        wait_for_dom_quiet(driver, timeout=2)
     except:
         print("Cookie button not found or already accepted.")
 
+def warm_up(driver):
+    """Open the groceries home page and accept cookies so pooled sessions start ready to search."""
+    polite_get(driver, HOME_URL)
+    accept_cookies(driver)
+
+def get_driver_pool():
+    return driver_pool.get_pool("Sainsburys", create_driver, warm_up)
+
+def scrape_sainsburys_products(query=None):
+    if query is None:
+        query = input("Search for Sainsbury's product: ")
+    query = query.strip() or "milk"
+    encoded_query = quote_plus(query)
+    base_filename = f"sainsburys_{query.replace(' ', '_')}_{datetime.now().strftime('%Y%m%d')}"
+
+    global emergency_data, emergency_filename_base, emergency_driver
+    emergency_filename_base = base_filename
+
+    all_data = []
+    emergency_data = all_data  # Shared reference, nothing to copy per page
+    seen = DedupIndex(persist_path("sainsburys"))
+    journal = CheckpointJournal(base_filename)
+    store = parquet_store.open_writer("sainsburys", query)  # None unless PARQUET_STORE_DIR is set
+    page_count = 1
+    consecutive_failures = 0
+    max_consecutive_failures = 3
+    page_urls = None
+    pool = get_driver_pool()
+    driver = None
+
     def check_for_error_and_retry():
         """Check for error page and click Try again button if found"""
         try:
             try_again_button = driver.find_element(By.CSS_SELECTOR, 'button[data-testid="error-button"]')
             if try_again_button.is_displayed():
                 print("Found 'Try again' button - clicking to retry...")
-                driver.execute_script("arguments[0].click();", try_again_button)
-                time.sleep(3)  # Reduced wait time
+                polite_click(driver, try_again_button, HOME_URL, js=True)
+                wait_for_dom_quiet(driver, timeout=3)
                 return True
         except NoSuchElementException:
             pass
@@ -153,12 +222,14 @@ def scrape_sainsburys_products():
         
         try:
             # Primary selector (most common)
-            primary_selector = "div.pt__wrapper-inner"
+            primary_selector = PRODUCT_TILE
+            tile_selector = primary_selector
             
             # Try primary selector first with shorter timeout
             products = None
             try:
-                WebDriverWait(driver, 5).until(EC.presence_of_element_located((By.CSS_SELECTOR, primary_selector)))
+                with metrics.phase("wait"):
+                    WebDriverWait(driver, 5).until(EC.presence_of_element_located((By.CSS_SELECTOR, primary_selector)))
                 products = driver.find_elements(By.CSS_SELECTOR, primary_selector)
                 if products:
                     print(f"Found {len(products)} products using selector: {primary_selector}")
@@ -171,7 +242,6 @@ def scrape_sainsburys_products():
                     print(f"5+ seconds elapsed ({elapsed_time:.1f}s) without finding products - checking for errors...")
                     if check_for_error_and_retry():
                         print("Retried after error - attempting to scrape again...")
-                        time.sleep(2)
                         # Try primary selector again after retry
                         try:
                             WebDriverWait(driver, 5).until(EC.presence_of_element_located((By.CSS_SELECTOR, primary_selector)))
@@ -194,6 +264,7 @@ def scrape_sainsburys_products():
                             WebDriverWait(driver, 3).until(EC.presence_of_element_located((By.CSS_SELECTOR, selector)))
                             products = driver.find_elements(By.CSS_SELECTOR, selector)
                             if products:
+                                tile_selector = selector
                                 print(f"Found {len(products)} products using fallback selector: {selector}")
                                 break
                         except TimeoutException:
@@ -211,10 +282,10 @@ def scrape_sainsburys_products():
                 print(f"5+ seconds elapsed ({elapsed_time:.1f}s) - checking for errors...")
                 if check_for_error_and_retry():
                     print("Retried after error - attempting to scrape again...")
-                    time.sleep(2)
                     try:
-                        WebDriverWait(driver, 5).until(EC.presence_of_element_located((By.CSS_SELECTOR, "div.pt__wrapper-inner")))
-                        products = driver.find_elements(By.CSS_SELECTOR, "div.pt__wrapper-inner")
+                        tile_selector = PRODUCT_TILE
+                        WebDriverWait(driver, 5).until(EC.presence_of_element_located((By.CSS_SELECTOR, tile_selector)))
+                        products = driver.find_elements(By.CSS_SELECTOR, tile_selector)
                         if products:
                             print(f"Found {len(products)} products after retry")
                         else:
@@ -231,82 +302,18 @@ def scrape_sainsburys_products():
                 consecutive_failures += 1
                 return 0
 
-        scraped_count = 0
-        
-        for i, product in enumerate(products):
+        # The product API response behind this page, else every tile's fields in a single round trip
+        items = api_capture.take(driver)
+        if items:
+            print(f"Read {len(items)} products from the product API")
+        else:
             try:
-                # Optimized selectors - try most common first
-                name_elem = None
-                url = None
-                
-                # Primary name selector
-                try:
-                    name_elem = product.find_element(By.CSS_SELECTOR, "h2.pt__info__description a")
-                    name = name_elem.text.strip()
-                    url = name_elem.get_attribute("href").strip()
-                except:
-                    # Fallback selectors
-                    fallback_name_selectors = [
-                        "a[data-test-id='product-tile-description']",
-                        ".pt__info__description a",
-                        "h3 a",
-                        "a[title]"
-                    ]
-                    
-                    for selector in fallback_name_selectors:
-                        try:
-                            name_elem = product.find_element(By.CSS_SELECTOR, selector)
-                            name = name_elem.text.strip()
-                            url = name_elem.get_attribute("href").strip()
-                            if name and url:
-                                break
-                        except:
-                            continue
-                
-                if not name or not url:
-                    continue
-                
-                # Optimized price extraction
-                price = "N/A"
-                try:
-                    price = product.find_element(By.CSS_SELECTOR, "span.pt__cost__retail-price").text.strip()
-                except:
-                    try:
-                        price = product.find_element(By.CSS_SELECTOR, "[data-test-id='product-tile-price']").text.strip()
-                    except:
-                        pass
-                
-                # Optimized unit price extraction
-                unit_price = "N/A"
-                try:
-                    unit_price = product.find_element(By.CSS_SELECTOR, "span.pt__cost__unit-price-per-measure").text.strip()
-                except:
-                    try:
-                        unit_price = product.find_element(By.CSS_SELECTOR, "[data-test-id='product-tile-unit-price']").text.strip()
-                    except:
-                        pass
-
-                if url in seen_urls:
-                    continue
-
-                data = {
-                    "Name": name,
-                    "Price": price,
-                    "Unit Price": unit_price,
-                    "URL": url,
-                    "Page": page_count,
-                    "Scraped At": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                }
-
-                all_data.append(data)
-                emergency_data[:] = all_data
-                seen_urls.add(url)
-                scraped_count += 1
-                
+                items = extract_products(driver, tile_selector)
             except Exception as e:
-                print(f"Error scraping product {i+1}: {e}")
-                continue
-        
+                print(f"Error extracting products: {e}")
+                items = []
+
+        scraped_count = add_items(items, page_count)
         if scraped_count > 0:
             consecutive_failures = 0
         else:
@@ -315,6 +322,52 @@ def scrape_sainsburys_products():
         print(f"Scraped {scraped_count} products from page {page_count}")
         return scraped_count
 
+    def add_items(items, page):
+        """Keep the unseen products from one page and checkpoint them. Returns how many were new."""
+        scraped_count = 0
+        page_data = []
+        for item in items:
+            url = item["URL"]
+            if not seen.add(url):
+                continue
+
+            data = {
+                "Name": item["Name"],
+                "Price": item["Price"],
+                "Unit Price": item["Unit Price"],
+                "URL": url,
+                # Extra columns the product API provides (Promo, Nectar Price, ...)
+                **{key: value for key, value in item.items() if key not in PRODUCT_FIELDS},
+                "Page": page,
+                "Scraped At": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            }
+
+            page_data.append(data)
+            scraped_count += 1
+
+        progress.page_loaded(page, len(page_urls) + 1 if page_urls else None)
+        all_data.extend(page_data)
+        journal.append(page_data)
+        progress.products(page_data)
+        if store:
+            store.write_batch(page_data)
+        return scraped_count
+
+    def scrape_url(page_url):
+        """Load one result page in its own pooled session for the fan-out workers. Returns (products, pagination links)."""
+        with pool.session() as session, api_capture.watching(session, API_PRODUCTS):
+            polite_get(session, page_url)
+            if not wait_for_tile_count(session, PRODUCT_TILE, 1, timeout=10):
+                # Same recovery as the main session: the error page has a Try again button
+                retry = session.find_elements(By.CSS_SELECTOR, 'button[data-testid="error-button"]')
+                if not retry:
+                    return None
+                polite_click(session, retry[0], HOME_URL, js=True)
+                if not wait_for_tile_count(session, PRODUCT_TILE, 1, timeout=10):
+                    return None
+            wait_for_dom_quiet(session, quiet=0.3, timeout=3)
+            return api_capture.take(session) or extract_products(session), pagination_links(session, PAGE_LINKS)
+
     def has_next_page():
         """Check if there's a next page button available"""
         try:
@@ -378,108 +431,127 @@ def scrape_sainsburys_products():
                 return False
             
             # Click using JavaScript to avoid interception
-            driver.execute_script("arguments[0].click();", next_button)
+            polite_click(driver, next_button, HOME_URL, js=True)
             print("Next page clicked. Waiting for new content...")
             
-            # Optimized page change detection
-            max_wait_time = 10  # Reduced from 20
-            start_time = time.time()
-            
-            while time.time() - start_time < max_wait_time:
-                time.sleep(1)  # Reduced check interval
-                
-                try:
-                    # Check if URL changed (most reliable)
-                    current_url = driver.current_url
-                    if current_url != current_url_before:
-                        print("URL changed, page loaded")
-                        time.sleep(1)  # Brief wait for content to settle
-                        return True
-                    
-                    # Quick check for new products
-                    try:
-                        WebDriverWait(driver, 1).until(EC.presence_of_element_located((By.CSS_SELECTOR, "div.pt__wrapper-inner")))
-                        time.sleep(1)  # Brief wait for content to settle
-                        return True
-                    except:
-                        pass
-                        
-                except Exception as e:
-                    print(f"Error during page change detection: {e}")
-                    time.sleep(1)
+            # URL change is the most reliable signal; then wait for the new tiles to settle
+            if wait_for_url_change(driver, current_url_before, timeout=10):
+                print("URL changed, page loaded")
+                wait_for_tile_count(driver, PRODUCT_TILE, 1, timeout=5)
+                wait_for_dom_quiet(driver, quiet=0.3, timeout=3)
+                return True
             
             print("Page change not detected within timeout, but continuing...")
-            time.sleep(2)  # Give it a bit more time
+            wait_for_dom_quiet(driver, timeout=2)
             return True
             
         except Exception as e:
             print(f"Error clicking next page: {e}")
             return False
 
-    # Main scraping loop
-    while True:
-        scraped_count = scrape_current_page()
-        
-        # Check for consecutive failures
-        if consecutive_failures >= max_consecutive_failures:
-            print(f"Too many consecutive failures ({consecutive_failures}), stopping.")
-            break
+    try:
+        driver = pool.checkout()  # Already warmed up with cookies accepted
+        emergency_driver = driver
+        api_capture.watch(driver, API_PRODUCTS)  # No-op unless API_CAPTURE is on
+
+        # Start with page 1
+        url = f"{BASE_URL}/gol-ui/SearchResults/{encoded_query}"
+        print(f"Searching Sainsbury's for: {query}")
+        print(f"Opening URL: {url}")
+        polite_get(driver, url)
+
+        # Main scraping loop
+        while not progress.cancelled():
+            scraped_count = scrape_current_page()
+
+            # If the pagination bar links every page by URL, load the rest side by side instead of clicking Next
+            if page_count == 1 and scraped_count > 0:
+                page_urls = page_urls_from_links(pagination_links(driver, PAGE_LINKS))
+                if page_urls:
+                    break
         
-        if scraped_count == 0:
-            print("No products found on current page.")
-            if consecutive_failures >= 2:
-                print("Multiple pages with no products, likely reached end.")
+            # Check for consecutive failures
+            if consecutive_failures >= max_consecutive_failures:
+                print(f"Too many consecutive failures ({consecutive_failures}), stopping.")
                 break
         
-        # Check if there's a next page
-        if not has_next_page():
-            print("No more pages available.")
-            break
-        
-        # Save partial results every 5 pages
-        if page_count % 5 == 0:
-            print(f"Saving partial results after page {page_count}...")
-            save_data_batch(all_data, f"{base_filename}_page_{page_count}", final=False)
+            if scraped_count == 0:
+                print("No products found on current page.")
+                if consecutive_failures >= 2:
+                    print("Multiple pages with no products, likely reached end.")
+                    break
         
-        # Try to go to next page
-        if not click_next_page():
-            print("Failed to navigate to next page, stopping.")
-            break
+            # Check if there's a next page
+            if not has_next_page():
+                print("No more pages available.")
+                break
         
-        page_count += 1
+            # Try to go to next page
+            if not click_next_page():
+                print("Failed to navigate to next page, stopping.")
+                break
         
-        # Reduced delay between pages
-        time.sleep(1)  # Reduced from 3
+            page_count += 1
         
-        # Safety check to prevent infinite loops
-        if page_count > 100:
-            print("Reached maximum page limit, stopping.")
-            break
-
-    print(f"\nScraping completed! Total pages: {page_count}")
-    print(f"Total unique products found: {len(all_data)}")
-    print("Final save...")
-    save_data_batch(all_data, base_filename, final=True)
-    atexit.unregister(emergency_save)
+            # Safety check to prevent infinite loops
+            if page_count > MAX_PAGES:
+                print("Reached maximum page limit, stopping.")
+                break
 
-    try:
-        driver.quit()
-    except Exception as e:
-        print(f"Error while quitting driver: {e}")
-    print("Browser closed.")
+        if page_urls:
+            emergency_driver = None
+            api_capture.unwatch(driver)
+            pool.checkin(driver)  # Free for the page workers
+            driver = None
+            workers = worker_count(pool)
+            print(f"{len(page_urls)} more pages, scraping {workers} at a time...")
+            for page_count, page_url, items in fan_out_pages(page_urls, scrape_url, workers, max_pages=MAX_PAGES):
+                if progress.cancelled():
+                    print("Search cancelled, saving what we have.")
+                    break
+                if items is None:
+                    print(f"No products loaded from page {page_count}, skipping.")
+                    continue
+                print(f"Scraped {add_items(items, page_count)} products from page {page_count}")
+    finally:
+        # Also runs after an error, so the rows found so far are saved and the session goes back
+        print(f"\nScraping completed! Total pages: {page_count}")
+        print(f"Total unique products found: {len(all_data)}")
+        print("Final save...")
+        journal.close()
+        if store:
+            store.close()
+        save_data_batch(all_data, base_filename, final=True)
+        atexit.unregister(emergency_save)
+        seen.close()
+        emergency_driver = None
+        if driver is not None:
+            api_capture.unwatch(driver)
+            try:
+                pool.checkin(driver)
+            except Exception as e:
+                print(f"Error while returning driver to pool: {e}")
+            print("Browser returned to pool.")
 
 # Suppress stderr (as last-resort to silence undetected-chromedriver exit noise)
 def suppress_stderr():
     sys.stderr = open(os.devnull, 'w')
 
-atexit.register(suppress_stderr)
+def scrape(query, options=None):
+    """In-process entry point for app.py (see progress.run)."""
+    return progress.run(scrape_sainsburys_products, query, options)
 
 if __name__ == "__main__":
+    # Emergency save on Ctrl+C or kill only applies to command-line runs
+    signal.signal(signal.SIGINT, emergency_save)
+    signal.signal(signal.SIGTERM, emergency_save)
+    atexit.register(emergency_save)
+    atexit.register(suppress_stderr)
     print("Starting Sainsbury's Scraper (Optimized)")
     print("=" * 50)
     print("Ctrl+C anytime to save and quit safely.")
     print("Data saves to CSV and Excel.")
-    print("Partial saves every 5 pages.")
+    print("Every page is checkpointed to an .ndjson journal.")
     print("=" * 50)
     try:
         scrape_sainsburys_products()
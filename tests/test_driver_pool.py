@@ -0,0 +1,79 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import driver_pool
+
+
+class FakeDriver:
+    window_handles = ["main"]
+
+    def execute_script(self, script, *args):
+        return "complete"
+
+    def execute_cdp_cmd(self, cmd, params):
+        return {}
+
+    def get_log(self, kind):
+        return []
+
+    def quit(self):
+        pass
+
+
+class BrowserLimitTest(unittest.TestCase):
+
+    def setUp(self):
+        self.saved_limit = driver_pool.MAX_BROWSERS
+        driver_pool.MAX_BROWSERS = 2
+        self.pools = [driver_pool.DriverPool(name, FakeDriver, size=2) for name in ("A", "B")]
+        with driver_pool._pools_lock:
+            for pool in self.pools:
+                driver_pool._pools[pool.name] = pool
+
+    def tearDown(self):
+        for pool in self.pools:
+            pool.close()
+        with driver_pool._pools_lock:
+            for pool in self.pools:
+                driver_pool._pools.pop(pool.name, None)
+        driver_pool.MAX_BROWSERS = self.saved_limit
+
+    def test_idle_browser_of_another_pool_is_closed_to_make_room(self):
+        a, b = self.pools
+        first, second = a.checkout(), a.checkout()
+        a.checkin(first)
+        driver = b.checkout(timeout=2)
+        self.assertEqual(driver_pool.live_browsers(), 2)
+        self.assertEqual((a._total, b._total), (1, 1))
+        b.checkin(driver)
+        a.checkin(second)
+
+    def test_checkout_times_out_when_every_browser_is_in_use(self):
+        a, b = self.pools
+        held = [a.checkout(), a.checkout()]
+        with self.assertRaises(TimeoutError):
+            b.checkout(timeout=1)
+        self.assertEqual(driver_pool.live_browsers(), 2)
+        for driver in held:
+            a.checkin(driver)
+
+    def test_prewarm_stops_at_the_limit(self):
+        a, b = self.pools
+        a.prewarm()
+        b.prewarm()
+        self.assertEqual((len(a._idle), len(b._idle)), (2, 0))
+
+    def test_checkin_after_close_is_not_counted_twice(self):
+        a, b = self.pools
+        driver = a.checkout()
+        a.close()
+        a.checkin(driver)
+        self.assertEqual(a._total, 0)
+        self.assertEqual(driver_pool.live_browsers(), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,94 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import fanout
+
+
+def pagination_bar(current, last, base="https://www.example.com/search?q=milk&page={}"):
+    """(text, href) pairs for a bar showing page 1, a window around `current` and Next."""
+    numbers = [1] + [n for n in range(max(2, current - 1), min(last, current + 2) + 1)]
+    links = [(str(n), base.format(n)) for n in sorted(set(numbers))]
+    if current < last:
+        links.append(("Next", base.format(current + 1)))
+    return links
+
+
+class PageUrlTemplateTest(unittest.TestCase):
+
+    def test_page_parameter_followed_by_more_parameters(self):
+        template = fanout.page_url_template("https://www.example.com/search?page=2&sort=price", 2)
+        self.assertEqual(template.format(7), "https://www.example.com/search?page=7&sort=price")
+
+    def test_page_colon_path_segment(self):
+        template = fanout.page_url_template("https://www.example.com/search/milk/page:2", 2)
+        self.assertEqual(template.format(3), "https://www.example.com/search/milk/page:3")
+
+    def test_search_term_containing_page2_is_left_alone(self):
+        template = fanout.page_url_template("https://www.example.com/search?q=page2&page=2", 2)
+        self.assertEqual(template.format(5), "https://www.example.com/search?q=page2&page=5")
+
+    def test_page_number_is_not_matched_inside_a_longer_number(self):
+        self.assertIsNone(fanout.page_url_template("https://www.example.com/search?page=23", 2))
+
+    def test_literal_braces_survive_formatting(self):
+        template = fanout.page_url_template("https://www.example.com/search?f={brand}&page=2", 2)
+        self.assertEqual(template.format(4), "https://www.example.com/search?f={brand}&page=4")
+
+    def test_unaddressable_link_gives_none(self):
+        self.assertIsNone(fanout.page_url_template("https://www.example.com/search#results", 2))
+
+
+class PageUrlsFromLinksTest(unittest.TestCase):
+
+    def test_builds_every_page_up_to_the_highest_number_shown(self):
+        links = [("1", "/s?page=1"), ("2", "/s?page=2"), ("3", "/s?page=3"), ("…", None), ("6", "/s?page=6"), ("Next", "/s?page=2")]
+        self.assertEqual(fanout.page_urls_from_links(links), [f"/s?page={n}" for n in range(2, 7)])
+
+    def test_no_link_to_page_two_gives_none(self):
+        self.assertIsNone(fanout.page_urls_from_links([("1", "/s?page=1"), ("Next", "/s?page=2")]))
+
+    def test_javascript_only_links_give_none(self):
+        self.assertIsNone(fanout.page_urls_from_links([("1", ""), ("2", "javascript:void(0)")]))
+
+
+class FanOutPagesTest(unittest.TestCase):
+
+    def scraper(self, last, seen):
+        def scrape_url(url):
+            page = int(url.rsplit("=", 1)[1])
+            seen.append(page)
+            return [f"product-{page}"], pagination_bar(page, last)
+        return scrape_url
+
+    def test_windowed_bar_is_followed_past_the_first_batch(self):
+        seen = []
+        first = fanout.page_urls_from_links(pagination_bar(1, 12))
+        self.assertEqual(len(first), 2)  # Page 1 only shows 1 2 3 ...
+        results = list(fanout.fan_out_pages(first, self.scraper(12, seen), workers=3))
+        self.assertEqual([page for page, url, rows in results], list(range(2, 13)))
+        self.assertEqual([rows for page, url, rows in results], [[f"product-{n}"] for n in range(2, 13)])
+        self.assertEqual(sorted(seen), list(range(2, 13)))
+
+    def test_max_pages_stops_the_follow_on(self):
+        seen = []
+        first = fanout.page_urls_from_links(pagination_bar(1, 12))
+        pages = [page for page, url, rows in fanout.fan_out_pages(first, self.scraper(12, seen), workers=1, max_pages=5)]
+        self.assertEqual(pages, [2, 3, 4, 5])
+        self.assertEqual(seen, [2, 3, 4, 5])
+
+    def test_failed_last_page_ends_the_run(self):
+        def scrape_url(url):
+            if url.endswith("=3"):
+                raise RuntimeError("blocked")
+            return ["row"], pagination_bar(int(url.rsplit("=", 1)[1]), 12)
+
+        first = fanout.page_urls_from_links(pagination_bar(1, 12))
+        results = list(fanout.fan_out_pages(first, scrape_url, workers=1))
+        self.assertEqual([(page, rows) for page, url, rows in results], [(2, ["row"]), (3, None)])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,129 @@
+import os
+import sys
+import threading
+import time
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import jobs
+
+
+class TaskSchedulerTest(unittest.TestCase):
+
+    def make_task(self, order, name, release=None):
+        def fn():
+            order.append(name)
+            if release is not None:
+                release.wait(5)
+        return fn
+
+    def test_users_are_served_round_robin(self):
+        scheduler = jobs.TaskScheduler(0, per_retailer=10)
+        order = []
+        for i in range(3):
+            scheduler.submit("alice", "Asda", self.make_task(order, f"alice-{i}"))
+        scheduler.submit("bob", "Asda", self.make_task(order, "bob-0"))
+
+        with scheduler._cond:
+            picked = [scheduler._next_task()[1] for _ in range(4)]
+        for fn in picked:
+            fn()
+        self.assertEqual(order, ["alice-0", "bob-0", "alice-1", "alice-2"])
+        self.assertEqual(scheduler.queued(), 0)
+
+    def test_busy_retailer_is_skipped_for_the_next_task(self):
+        scheduler = jobs.TaskScheduler(0, per_retailer=1)
+        order = []
+        scheduler.submit("alice", "Asda", self.make_task(order, "asda"))
+        scheduler.submit("alice", "Tesco", self.make_task(order, "tesco"))
+        with scheduler._cond:
+            scheduler._running["Asda"] = 1
+            retailer, fn = scheduler._next_task()
+            self.assertEqual(retailer, "Tesco")
+            self.assertIsNone(scheduler._next_task())
+
+    def test_per_retailer_cap_holds_with_free_workers(self):
+        release = threading.Event()
+        scheduler = jobs.TaskScheduler(3, per_retailer=1)
+        order = []
+        for i in range(3):
+            scheduler.submit(f"user-{i}", "Asda", self.make_task(order, f"asda-{i}", release))
+        time.sleep(0.2)
+        self.assertEqual(scheduler.running(), {"Asda": 1})
+        self.assertEqual(scheduler.queued(), 2)
+        release.set()
+        deadline = time.time() + 5
+        while (scheduler.queued() or scheduler.running()) and time.time() < deadline:
+            time.sleep(0.05)
+        self.assertEqual(order, ["asda-0", "asda-1", "asda-2"])
+
+    def test_failed_task_frees_its_worker(self):
+        scheduler = jobs.TaskScheduler(1)
+        done = threading.Event()
+
+        def fail():
+            raise RuntimeError("boom")
+
+        scheduler.submit("alice", "Asda", fail)
+        scheduler.submit("alice", "Asda", done.set)
+        self.assertTrue(done.wait(5))
+
+
+class StartOrAttachTest(unittest.TestCase):
+
+    def test_identical_queries_share_one_job(self):
+        release = threading.Event()
+        runs = []
+
+        def run(job):
+            runs.append(job)
+            release.wait(5)
+
+        first, created = jobs.start_or_attach("Semi Skimmed Milk", run)
+        second, attached_created = jobs.start_or_attach("  semi skimmed milk ", run)
+        self.assertTrue(created)
+        self.assertFalse(attached_created)
+        self.assertIs(first, second)
+
+        release.set()
+        deadline = time.time() + 5
+        while not first.done and time.time() < deadline:
+            time.sleep(0.05)
+        self.assertTrue(first.done)
+        self.assertEqual(len(runs), 1)
+
+        third, created = jobs.start_or_attach("semi skimmed milk", lambda job: None)
+        self.assertTrue(created)
+        self.assertIsNot(third, first)
+
+    def test_refresh_does_not_join_a_job_replaying_the_cache(self):
+        release = threading.Event()
+        cached, _ = jobs.start_or_attach("butter", lambda job: release.wait(5))
+        fresh, created = jobs.start_or_attach("butter", lambda job: release.wait(5), fresh=True)
+        self.assertTrue(created)
+        self.assertIsNot(fresh, cached)
+        again, created = jobs.start_or_attach("Butter", lambda job: None, fresh=True)
+        self.assertFalse(created)
+        self.assertIs(again, fresh)
+        release.set()
+
+    def test_cancelled_job_is_not_joined(self):
+        release = threading.Event()
+        job, _ = jobs.start_or_attach("bread rolls", lambda job: release.wait(5))
+        jobs.cancel(job)
+        other, created = jobs.start_or_attach("bread rolls", lambda job: None)
+        self.assertTrue(created)
+        self.assertIsNot(other, job)
+        release.set()
+
+    def test_api_caller_keeps_a_shared_job_alive(self):
+        release = threading.Event()
+        job, _ = jobs.start_or_attach("eggs", lambda job: release.wait(5), cancel_when_abandoned=True)
+        jobs.start_or_attach("eggs", lambda job: None, cancel_when_abandoned=False)
+        self.assertFalse(job.cancel_when_abandoned)
+        release.set()
+
+
+if __name__ == "__main__":
+    unittest.main()
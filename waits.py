@@ -0,0 +1,96 @@
+import time
+from selenium.webdriver.support.ui import WebDriverWait
+from selenium.common.exceptions import TimeoutException
+
+import progress
+from metrics import timed
+
+# Each wait returns as soon as its signal fires and gives up after `timeout` seconds.
+# None of them raise on timeout: they return False (or the last observed value) so
+# callers can carry on exactly as they did after a fixed sleep. Polling waits also return
+# early once the search is cancelled.
+
+_DOM_QUIET_JS = """
+var quietMs = arguments[0], timeoutMs = arguments[1], done = arguments[arguments.length - 1];
+var start = Date.now(), last = Date.now();
+var observer = new MutationObserver(function () { last = Date.now(); });
+observer.observe(document.documentElement || document, {childList: true, subtree: true, characterData: true});
+(function check() {
+    var now = Date.now();
+    if (now - last >= quietMs) { observer.disconnect(); done(true); }
+    else if (now - start >= timeoutMs) { observer.disconnect(); done(false); }
+    else setTimeout(check, 50);
+})();
+"""
+
+# Resource timing only lists finished requests, so "idle" here means no request
+# has completed for idleMs and the document itself has finished loading.
+_NETWORK_IDLE_JS = """
+var idleMs = arguments[0], timeoutMs = arguments[1], done = arguments[arguments.length - 1];
+if (performance.setResourceTimingBufferSize) performance.setResourceTimingBufferSize(10000);
+var start = Date.now(), last = Date.now(), seen = -1;
+(function check() {
+    var now = Date.now(), count = performance.getEntriesByType("resource").length;
+    if (count !== seen) { seen = count; last = now; }
+    if (document.readyState === "complete" && now - last >= idleMs) done(true);
+    else if (now - start >= timeoutMs) done(false);
+    else setTimeout(check, 50);
+})();
+"""
+
+_COUNT_JS = "return document.querySelectorAll(arguments[0]).length;"
+
+
+def _run_async(driver, script, quiet, timeout):
+    driver.set_script_timeout(timeout + 5)
+    try:
+        return bool(driver.execute_async_script(script, int(quiet * 1000), int(timeout * 1000)))
+    except Exception as e:
+        print(f"Wait script failed ({e}), continuing.")
+        return False
+
+
+@timed("wait")
+def wait_for_dom_quiet(driver, quiet=0.5, timeout=10):
+    """Wait until no nodes have been added, removed or re-texted for `quiet` seconds."""
+    return _run_async(driver, _DOM_QUIET_JS, quiet, timeout)
+
+
+@timed("wait")
+def wait_for_network_idle(driver, idle=0.5, timeout=10):
+    """Wait until the page has loaded and no request has completed for `idle` seconds."""
+    return _run_async(driver, _NETWORK_IDLE_JS, idle, timeout)
+
+
+def count_tiles(driver, selector):
+    return driver.execute_script(_COUNT_JS, selector)
+
+
+@timed("wait")
+def wait_for_tile_count(driver, selector, minimum=1, timeout=10, poll=0.1):
+    """Wait until at least `minimum` elements match `selector`. Returns the last count seen."""
+    deadline = time.time() + timeout
+    count = 0
+    while True:
+        try:
+            count = count_tiles(driver, selector)
+        except Exception:
+            count = 0
+        if count >= minimum or time.time() >= deadline or progress.cancelled():
+            return count
+        time.sleep(poll)
+
+
+def wait_for_count_growth(driver, selector, previous, timeout=10, poll=0.1):
+    """Wait until more than `previous` elements match `selector`. Returns the last count seen."""
+    return wait_for_tile_count(driver, selector, previous + 1, timeout, poll)
+
+
+@timed("wait")
+def wait_for_url_change(driver, old_url, timeout=10):
+    """Wait until the browser has navigated away from `old_url`."""
+    try:
+        WebDriverWait(driver, timeout, poll_frequency=0.1).until(lambda d: d.current_url != old_url)
+        return True
+    except TimeoutException:
+        return False